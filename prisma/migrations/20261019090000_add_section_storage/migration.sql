@@ -0,0 +1,4 @@
+-- AlterTable
+ALTER TABLE "BookSection" ADD COLUMN     "compressedContent" BYTEA,
+ADD COLUMN     "contentHash" TEXT,
+ADD COLUMN     "storage" TEXT NOT NULL DEFAULT 'plain';
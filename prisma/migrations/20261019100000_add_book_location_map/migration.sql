@@ -0,0 +1,16 @@
+-- CreateTable
+CREATE TABLE "BookLocationMap" (
+    "id" TEXT NOT NULL,
+    "bookId" TEXT NOT NULL,
+    "data" JSONB NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "BookLocationMap_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "BookLocationMap_bookId_key" ON "BookLocationMap"("bookId");
+
+-- AddForeignKey
+ALTER TABLE "BookLocationMap" ADD CONSTRAINT "BookLocationMap_bookId_fkey" FOREIGN KEY ("bookId") REFERENCES "Book"("id") ON DELETE CASCADE ON UPDATE CASCADE;
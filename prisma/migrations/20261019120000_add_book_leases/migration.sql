@@ -0,0 +1,10 @@
+-- CreateTable
+CREATE TABLE "BookLease" (
+    "bookId" TEXT NOT NULL,
+    "kind" TEXT NOT NULL,
+    "owner" TEXT NOT NULL,
+    "expiresAt" TIMESTAMP(3) NOT NULL,
+    "completedRun" TEXT,
+
+    CONSTRAINT "BookLease_pkey" PRIMARY KEY ("bookId","kind")
+);
@@ -0,0 +1,25 @@
+import { NextResponse } from 'next/server';
+import { prisma } from '@/lib/db';
+
+export async function GET(
+  request: Request,
+  { params }: { params: { id: string } }
+) {
+  try {
+    const locationMap = await prisma.bookLocationMap.findUnique({
+      where: { bookId: params.id }
+    });
+
+    if (!locationMap) {
+      return new NextResponse('Location map not found', { status: 404 });
+    }
+
+    // The map only changes when the book is re-processed
+    return NextResponse.json(locationMap.data, {
+      headers: { 'Cache-Control': 'public, max-age=3600, stale-while-revalidate=86400' }
+    });
+  } catch (error) {
+    console.error('Error fetching location map:', error);
+    return new NextResponse('Internal Server Error', { status: 500 });
+  }
+}
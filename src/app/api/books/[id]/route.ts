@@ -1,5 +1,6 @@
 import { NextResponse } from 'next/server';
 import { prisma } from '@/lib/db';
+import { sectionText } from '@/lib/sections';
 
 export async function GET(
   request: Request,
@@ -32,8 +33,15 @@ export async function GET(
       return new NextResponse('Book not found', { status: 404 });
     }
 
+    // Sections may be stored compressed; readers always get the plain text
+    const sections = book.sections.map(({ compressedContent, contentHash, ...section }) => ({
+      ...section,
+      content: sectionText({ ...section, compressedContent, contentHash }),
+      storage: 'plain'
+    }));
+
     // Allow access to all books without authentication
-    return NextResponse.json(book);
+    return NextResponse.json({ ...book, sections });
   } catch (error) {
     console.error('Error fetching book:', error);
     return new NextResponse(`Internal Server Error: ${error instanceof Error ? error.message : 'Unknown error'}`, { status: 500 });
@@ -42,6 +42,14 @@ export async function POST(request: Request) {
       }
     });
 
+    // Queue sectioning and summarization for the Python worker daemon
+    await prisma.job.create({
+      data: {
+        type: 'process_book',
+        bookId: book.id
+      }
+    });
+
     // Create initial reading state
     await prisma.readingState.create({
       data: {
@@ -1,12 +1,13 @@
 'use client';
 
-import { useState, useEffect, useCallback, memo } from 'react';
+import { useState, useEffect, useCallback, useRef, memo } from 'react';
 import { useParams, useRouter } from 'next/navigation';
 import Image from 'next/image';
 import Link from 'next/link';
 import { EPUBReader } from '@/components/BookReader/EPUBReader';
 import { getBookTheme } from '@/lib/colors';
 import { BookCover } from '@/components/BookCover';
+import { fetchLocationMap, wordOffsetForLocation, LocationMap, ReaderLocation } from '@/lib/epub';
 
 interface Book {
   id: string;
@@ -24,10 +25,11 @@ interface Book {
 const FALLBACK_EPUB_URL = 'https://s3.amazonaws.com/moby-dick/moby-dick.epub';
 
 // Create a memoized version of the EPUBReader component
-const MemoizedEPUBReader = memo(({ url, className, onProgressUpdate }: { 
+const MemoizedEPUBReader = memo(({ url, className, onProgressUpdate, onLocationChange }: { 
   url: string, 
   className: string, 
-  onProgressUpdate: (progress: number) => void 
+  onProgressUpdate: (progress: number) => void,
+  onLocationChange: (location: ReaderLocation) => void
 }) => {
   console.log('📚 Rendering Memoized EPUBReader with URL:', url);
   return (
@@ -35,6 +37,7 @@ const MemoizedEPUBReader = memo(({ url, className, onProgressUpdate }: {
       url={url} 
       className={className}
       onProgressUpdate={onProgressUpdate}
+      onLocationChange={onLocationChange}
     />
   );
 });
@@ -210,6 +213,9 @@ export default function BookPage() {
   const [error, setError] = useState<string | null>(null);
   const [isReading, setIsReading] = useState(false);
   const [currentPosition, setCurrentPosition] = useState<number>(0);
+  // Kept in a ref so loading it doesn't recreate the reader callbacks
+  const locationMapRef = useRef<LocationMap | null>(null);
+  const estimatedPositionRef = useRef(0);
   
   useEffect(() => {
     const fetchBook = async () => {
@@ -294,19 +300,36 @@ export default function BookPage() {
     return () => clearTimeout(timer);
   }, []);
   
+  // Load the word-offset map once so reader locations resolve without re-tokenizing the book
+  useEffect(() => {
+    if (!bookId) return;
+    fetchLocationMap(bookId)
+      .then((map) => { locationMapRef.current = map; })
+      .catch((err) => console.warn('⚠️ Could not load location map:', err));
+  }, [bookId]);
+  
   // Memoize the progress update handler to prevent recreating on each render
+  // (the reader calls it before handleLocationChange on every relocation)
   const handleProgressUpdate = useCallback((progress: number) => {
     console.log(`Reading progress: ${Math.round(progress * 100)}%`);
     
-    // Update current position when progress changes
     if (book) {
       // Estimate position based on progress percentage
-      // This is a simplification - ideally we would get the actual position from the reader
-      const estimatedPosition = Math.round(progress * 10000); // Scale to a reasonable number
-      setCurrentPosition(estimatedPosition);
+      // This is a simplification - the location map gives the exact offset when it lines up
+      estimatedPositionRef.current = Math.round(progress * 10000); // Scale to a reasonable number
+      if (!locationMapRef.current) {
+        setCurrentPosition(estimatedPositionRef.current);
+      }
     }
   }, [book]);
   
+  const handleLocationChange = useCallback((location: ReaderLocation) => {
+    if (!locationMapRef.current) return;
+    const position = wordOffsetForLocation(locationMapRef.current, location);
+    // Fall back to the percentage estimate where the rendered item doesn't match the map
+    setCurrentPosition(position ?? estimatedPositionRef.current);
+  }, []);
+  
   return (
     <>
       {loading ? (
@@ -362,6 +385,7 @@ export default function BookPage() {
                     url={getReliableEpubUrl(book) || ''} 
                     className="w-full h-full"
                     onProgressUpdate={handleProgressUpdate}
+                    onLocationChange={handleLocationChange}
                   />
                 </div>
               </div>
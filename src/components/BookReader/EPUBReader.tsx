@@ -1,6 +1,7 @@
 'use client';
 
 import { useState, useEffect, useRef, useCallback, useMemo } from 'react';
+import { paragraphLocationFromRange, ReaderLocation } from '@/lib/epub';
 
 // Global declaration for TypeScript
 declare global {
@@ -18,9 +19,10 @@ interface EPUBReaderProps {
   url: string;
   className?: string;
   onProgressUpdate?: (progress: number) => void;
+  onLocationChange?: (location: ReaderLocation) => void;
 }
 
-export function EPUBReader({ url, className = '', onProgressUpdate }: EPUBReaderProps) {
+export function EPUBReader({ url, className = '', onProgressUpdate, onLocationChange }: EPUBReaderProps) {
   // Convert Cloudinary URLs to use our proxy to avoid CORS issues
   const proxyUrl = useMemo(() => {
     if (!url) return '';
@@ -328,6 +330,16 @@ export function EPUBReader({ url, className = '', onProgressUpdate }: EPUBReader
               onProgressUpdate(percentage || 0);
             }
             
+            // Report the spine item and paragraph so callers can map it to a word offset
+            if (onLocationChange && location.start.href) {
+              const range = newRendition.getRange(location.start.cfi);
+              onLocationChange({
+                cfi: location.start.cfi,
+                href: location.start.href,
+                ...(range ? paragraphLocationFromRange(range) : { paragraphIndex: 0, paragraphCount: -1 })
+              });
+            }
+            
             // Calculate current page
             const currentPageNum = Math.max(1, Math.round(currentLoc));
             setCurrentPage(currentPageNum);
@@ -433,7 +445,7 @@ export function EPUBReader({ url, className = '', onProgressUpdate }: EPUBReader
         book.destroy();
       }
     };
-  }, [scriptsLoaded, proxyUrl, onProgressUpdate, logDebug]);
+  }, [scriptsLoaded, proxyUrl, onProgressUpdate, onLocationChange, logDebug]);
 
   // Handler for window resize
   useEffect(() => {
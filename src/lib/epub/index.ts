@@ -66,4 +66,124 @@ export function calculateReadingProgress(
   totalWords: number
 ): number {
   return Math.min(Math.round((position / totalWords) * 100), 100);
-} 
\ No newline at end of file
+} 
+export type LocationMap = {
+  version: number;
+  totalWords: number;
+  items: {
+    href: string;
+    start: number;
+    words: number[];
+  }[];
+  // Front/back matter left out of the text; its paragraphs count zero words
+  excluded?: {
+    kind: string;
+    href: string;
+    from: number;
+    to: number;
+    words: number;
+    at: number;
+  }[];
+};
+
+export type ReaderLocation = {
+  cfi: string;
+  href: string;
+  // Paragraph containing the location and paragraphs in the spine item, split as BookProcessor does
+  paragraphIndex: number;
+  paragraphCount: number;
+};
+
+export async function fetchLocationMap(bookId: string): Promise<LocationMap | null> {
+  const response = await fetch(`/api/books/${bookId}/locations`);
+  if (!response.ok) {
+    return null;
+  }
+  return response.json();
+}
+
+function findLocationItem(map: LocationMap, href: string) {
+  const path = href.split('#')[0];
+  return (
+    map.items.find((item) => item.href === path) ||
+    map.items.find((item) => path.endsWith(item.href) || item.href.endsWith(path))
+  );
+}
+
+// Block elements BookProcessor's clean_html turns into paragraph ('\n\n') or line ('\n') breaks
+const PARAGRAPH_BREAK_TAGS = new Set(['P']);
+const LINE_BREAK_TAGS = new Set(['DIV', 'BR', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
+const SKIPPED_TAGS = new Set(['SCRIPT', 'STYLE']);
+
+// Split text into paragraphs the way clean_html output is split on the server
+function countParagraphs(text: string): number {
+  const normalized = text
+    .replace(/\n{3,}/g, '\n\n')
+    .split('\n')
+    .map((line) => line.replace(/\s+/g, ' ').trim())
+    .join('\n')
+    .replace(/\n{3,}/g, '\n\n')
+    .trim();
+  return normalized ? normalized.split('\n\n').filter((paragraph) => paragraph.trim()).length : 0;
+}
+
+// Paragraph containing the start of a DOM range, and the item's paragraph count.
+// Text is rebuilt from text nodes with clean_html's breaks, so a single pre-wrap <p>
+// holding a whole book splits on its blank lines exactly like the server's paragraphs.
+export function paragraphLocationFromRange(range: Range): { paragraphIndex: number; paragraphCount: number } {
+  const doc = range.startContainer.ownerDocument;
+  if (!doc || !doc.body) return { paragraphIndex: 0, paragraphCount: 0 };
+
+  let text = '';
+  let before: string | null = null;
+
+  const visit = (node: Node) => {
+    if (before === null && node === range.startContainer) {
+      before = text + (node.nodeType === Node.TEXT_NODE ? (node.textContent || '').slice(0, range.startOffset) : '');
+    }
+    if (node.nodeType === Node.TEXT_NODE) {
+      text += node.textContent || '';
+      return;
+    }
+    if (node.nodeType !== Node.ELEMENT_NODE) return;
+    const tag = (node as Element).tagName.toUpperCase();
+    if (SKIPPED_TAGS.has(tag)) return;
+    const separator = PARAGRAPH_BREAK_TAGS.has(tag) ? '\n\n' : LINE_BREAK_TAGS.has(tag) ? '\n' : '';
+    text += separator;
+    node.childNodes.forEach(visit);
+    text += separator;
+  };
+  visit(doc.body);
+
+  const paragraphCount = countParagraphs(text);
+  // Text before the location ends inside the paragraph it belongs to, or right before it
+  const paragraphsBefore = countParagraphs((before ?? text) + 'x');
+  return {
+    paragraphIndex: Math.max(0, Math.min(paragraphsBefore - 1, paragraphCount - 1)),
+    paragraphCount
+  };
+}
+
+// Word offset at which each paragraph of an item starts, built once per map
+const prefixSums = new WeakMap<LocationMap['items'][number], number[]>();
+
+function paragraphStarts(item: LocationMap['items'][number]): number[] {
+  let starts = prefixSums.get(item);
+  if (!starts) {
+    starts = [item.start];
+    for (const words of item.words) {
+      starts.push(starts[starts.length - 1] + words);
+    }
+    prefixSums.set(item, starts);
+  }
+  return starts;
+}
+
+// Exact word offset of a location, or null when the item's paragraphs don't line up with the map
+export function wordOffsetForLocation(map: LocationMap, location: ReaderLocation): number | null {
+  const item = findLocationItem(map, location.href);
+  if (!item || location.paragraphCount !== item.words.length) return null;
+
+  const paragraphs = Math.max(0, Math.min(location.paragraphIndex, item.words.length));
+  return paragraphStarts(item)[paragraphs];
+}
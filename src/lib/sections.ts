@@ -0,0 +1,68 @@
+import fs from 'fs';
+import path from 'path';
+import zlib from 'zlib';
+
+// Mirrors src/services/section_storage.py: storage is plain | zlib[:dictionaryId] | zstd[:dictionaryId] | blob
+export interface StoredSection {
+  content: string;
+  storage: string;
+  compressedContent?: Buffer | Uint8Array | null;
+  contentHash?: string | null;
+}
+
+// Same default as config.py's DATA_DIR, relative to the app root
+const DATA_DIR = process.env.READRECALL_DATA_DIR || path.join(process.cwd(), 'src', 'services', '.data');
+
+const dictionaries = new Map<string, Buffer>();
+
+function dictionary(dictionaryId: string): Buffer {
+  let data = dictionaries.get(dictionaryId);
+  if (!data) {
+    data = fs.readFileSync(path.join(DATA_DIR, 'section_storage', 'dictionaries', `${dictionaryId}.dict`));
+    dictionaries.set(dictionaryId, data);
+  }
+  return data;
+}
+
+function blobPath(digest: string): string {
+  const root = process.env.SECTION_BLOB_DIR;
+  if (root) {
+    return path.join(root, digest.slice(0, 2), digest);
+  }
+  return path.join(DATA_DIR, 'section_storage', 'blobs', digest.slice(0, 2), digest);
+}
+
+/**
+ * Plain text body of a section in any storage mode the services write.
+ * zstd needs a Node.js build with zstd support; otherwise it throws rather
+ * than hand readers an empty section.
+ */
+export function sectionText(section: StoredSection): string {
+  const [mode, dictionaryId] = (section.storage || 'plain').split(':');
+  if (mode === 'plain') {
+    return section.content;
+  }
+  if (mode === 'blob') {
+    if (!section.contentHash) {
+      throw new Error('Blob section has no content hash');
+    }
+    return zlib.inflateSync(fs.readFileSync(blobPath(section.contentHash))).toString('utf-8');
+  }
+
+  if (!section.compressedContent) {
+    throw new Error(`Section stored as ${section.storage} has no compressed content`);
+  }
+  const data = Buffer.from(section.compressedContent);
+  const options = dictionaryId ? { dictionary: dictionary(dictionaryId) } : {};
+  if (mode === 'zlib') {
+    return zlib.inflateSync(data, options).toString('utf-8');
+  }
+  if (mode === 'zstd') {
+    const zstdDecompressSync = (zlib as any).zstdDecompressSync;
+    if (!zstdDecompressSync) {
+      throw new Error('Reading zstd sections requires a Node.js version with zstd support');
+    }
+    return zstdDecompressSync(data, dictionaryId ? { dictionary: dictionary(dictionaryId) } : {}).toString('utf-8');
+  }
+  throw new Error(`Unknown section storage mode: ${section.storage}`);
+}
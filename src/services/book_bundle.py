@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import mmap
+import bisect
+import struct
+import logging
+import argparse
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from prisma import Prisma
+from config import data_path
+from section_storage import SectionStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+BUNDLE_MAGIC = b'RRBK'
+BUNDLE_VERSION = 1
+
+# magic, version, flags, section count, summary count, total words
+HEADER = struct.Struct('<4sHHIII')
+# Byte offset and length of each region, in file order
+REGIONS = (
+    'metadata',
+    'section_starts', 'section_ends', 'section_offsets', 'section_data',
+    'summary_positions', 'summary_offsets', 'summary_data'
+)
+REGION_TABLE = struct.Struct(f'<{2 * len(REGIONS)}Q')
+
+def bundle_path(book_id: str) -> str:
+    """Where a book's bundle is written"""
+    return data_path('bundles', f"{book_id}.rrb")
+
+def _uint_array(typecode: str, values: Sequence[int]) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+def _uint_view(buffer: memoryview, typecode: str) -> Sequence[int]:
+    """Zero-copy view of a little-endian integer region (a copy on big-endian hosts)"""
+    if sys.byteorder == 'little':
+        return buffer.cast(typecode)
+    data = array(typecode, buffer.tobytes())
+    data.byteswap()
+    return data
+
+def pack_bundle(metadata: Dict[str, Any], sections: List[Tuple[int, int, str]],
+                summaries: List[Tuple[int, str]]) -> bytes:
+    """Serialize a book into one bundle.
+
+    Layout, all integers little-endian and every region 8-byte aligned:
+
+        header | region table | metadata JSON
+        | section start words (u32) | section end words (u32)
+        | section byte offsets (u64, count + 1) | section UTF-8 text
+        | summary positions (u32, sorted) | summary byte offsets (u64, count + 1)
+        | summary UTF-8 text
+
+    Sections and summaries are addressed through their offset tables, so
+    any one of them is a slice of the file without reading the others.
+    """
+    sections = sorted(sections)
+    summaries = sorted(summaries)
+    section_texts = [text.encode('utf-8') for _, _, text in sections]
+    summary_texts = [text.encode('utf-8') for _, text in summaries]
+
+    def offsets(blobs: List[bytes]) -> List[int]:
+        result = [0]
+        for blob in blobs:
+            result.append(result[-1] + len(blob))
+        return result
+
+    regions = [
+        json.dumps(metadata, ensure_ascii=False).encode('utf-8'),
+        _uint_array('I', [start for start, _, _ in sections]),
+        _uint_array('I', [end for _, end, _ in sections]),
+        _uint_array('Q', offsets(section_texts)),
+        b''.join(section_texts),
+        _uint_array('I', [position for position, _ in summaries]),
+        _uint_array('Q', offsets(summary_texts)),
+        b''.join(summary_texts),
+    ]
+
+    total_words = max((end for _, end, _ in sections), default=0)
+    header = HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(sections), len(summaries), total_words)
+    cursor = HEADER.size + REGION_TABLE.size
+    region_table = []
+    body = bytearray()
+    for region in regions:
+        padding = -cursor % 8
+        body += b'\0' * padding
+        cursor += padding
+        region_table += [cursor, len(region)]
+        body += region
+        cursor += len(region)
+    return header + REGION_TABLE.pack(*region_table) + bytes(body)
+
+class BookBundle:
+    """Read-only, memory-mapped view of a packed book bundle"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        magic, version, _, self.section_count, self.summary_count, self.total_words = HEADER.unpack_from(self.map, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {BUNDLE_VERSION} book bundle")
+        region_table = REGION_TABLE.unpack_from(self.map, HEADER.size)
+        self.regions = {name: region_table[2 * i:2 * i + 2] for i, name in enumerate(REGIONS)}
+
+        self.section_starts = _uint_view(self._region('section_starts'), 'I')
+        self.section_ends = _uint_view(self._region('section_ends'), 'I')
+        self.section_offsets = _uint_view(self._region('section_offsets'), 'Q')
+        self.summary_positions = _uint_view(self._region('summary_positions'), 'I')
+        self.summary_offsets = _uint_view(self._region('summary_offsets'), 'Q')
+        self._metadata: Optional[Dict[str, Any]] = None
+
+    def _region(self, name: str) -> memoryview:
+        offset, length = self.regions[name]
+        return self.view[offset:offset + length]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """Book fields, section titles and location map, decoded on first access"""
+        if self._metadata is None:
+            self._metadata = json.loads(bytes(self._region('metadata')))
+        return self._metadata
+
+    def section(self, index: int) -> str:
+        """Text of the section at an order index"""
+        base = self.regions['section_data'][0]
+        return str(self.view[base + self.section_offsets[index]:base + self.section_offsets[index + 1]], 'utf-8')
+
+    def section_at(self, position: int) -> Optional[int]:
+        """Index of the section containing a word position"""
+        index = bisect.bisect_right(self.section_starts, position) - 1
+        if index < 0 or position >= self.section_ends[index]:
+            return None
+        return index
+
+    def words_between(self, start: int, end: int) -> str:
+        """Words [start, end) of the book, reading only the sections they span"""
+        index = max(bisect.bisect_right(self.section_starts, start) - 1, 0)
+        words: List[str] = []
+        while index < self.section_count and self.section_starts[index] < end:
+            section_start = self.section_starts[index]
+            section_words = self.section(index).split()
+            words.extend(section_words[max(start - section_start, 0):max(end - section_start, 0)])
+            index += 1
+        return ' '.join(words)
+
+    def summary_at(self, position: int) -> Optional[Tuple[int, str]]:
+        """Latest summary checkpoint at or before a position, as (position, text)"""
+        index = bisect.bisect_right(self.summary_positions, position) - 1
+        if index < 0:
+            return None
+        base = self.regions['summary_data'][0]
+        text = str(self.view[base + self.summary_offsets[index]:base + self.summary_offsets[index + 1]], 'utf-8')
+        return self.summary_positions[index], text
+
+    def close(self):
+        """Unmap the file"""
+        # Views into the map must be released before it can be closed
+        for name in ('section_starts', 'section_ends', 'section_offsets', 'summary_positions', 'summary_offsets'):
+            value = getattr(self, name, None)
+            if isinstance(value, memoryview):
+                value.release()
+        if hasattr(self, 'view'):
+            self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> 'BookBundle':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BundleExporter:
+    """Writes processed books, their sections and summaries out as bundles"""
+
+    def __init__(self, db: Optional[Prisma] = None):
+        # Initialize Prisma client (a long-lived worker passes in a shared one)
+        self.db = db or Prisma()
+        self.sections = SectionStore(self.db)
+
+    async def connect(self):
+        """Connect to the database"""
+        try:
+            await self.db.connect()
+            logger.info("Connected to database successfully")
+        except Exception as e:
+            logger.error(f"Error connecting to database: {str(e)}")
+            raise
+
+    async def disconnect(self):
+        """Disconnect from the database"""
+        if self.db.is_connected():
+            await self.db.disconnect()
+            logger.info("Disconnected from database")
+
+    async def export_book(self, book_id: str) -> Optional[str]:
+        """Write one book's bundle, replacing any earlier one"""
+        book = await self.db.book.find_unique(
+            where={"id": book_id},
+            include={"locationMap": True}
+        )
+        if not book:
+            logger.error(f"Book {book_id} not found in database")
+            return None
+
+        sections = await self.sections.find_many(
+            where={"bookId": book_id},
+            order={"orderIndex": "asc"}
+        )
+        if not sections:
+            logger.warning(f"No sections found for book: {book_id}")
+            return None
+        summaries = await self.db.summary.find_many(where={"bookId": book_id})
+
+        metadata = {
+            "id": book.id,
+            "title": book.title,
+            "author": book.author,
+            "coverUrl": book.coverUrl,
+            "sectionTitles": [section.title for section in sections],
+            "locationMap": book.locationMap.data if book.locationMap else None
+        }
+        # One summary per checkpoint; if a position was summarized twice keep the newest
+        checkpoints = {}
+        for summary in sorted(summaries, key=lambda summary: summary.createdAt):
+            checkpoints[summary.position] = summary.content
+
+        bundle = pack_bundle(
+            metadata,
+            [(section.startPosition, section.endPosition, section.content) for section in sections],
+            list(checkpoints.items())
+        )
+        path = bundle_path(book_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(bundle)
+        os.replace(tmp_path, path)
+        logger.info(f"Exported book {book.title} ({len(sections)} sections, {len(checkpoints)} summaries) to {path}")
+        return path
+
+    async def export_all_books(self):
+        """Write bundles for every book in the database"""
+        books = await self.db.book.find_many()
+        for book in books:
+            try:
+                await self.export_book(book.id)
+            except Exception as e:
+                logger.error(f"Error exporting book {book.id}: {str(e)}")
+
+async def main():
+    """Export bundles, or read a summary from one with --book/--position"""
+    parser = argparse.ArgumentParser(description="Packed per-book bundles")
+    parser.add_argument('--book', help="only export this book")
+    parser.add_argument('--position', type=int, help="print the bundled summary for this position instead of exporting")
+    args = parser.parse_args()
+
+    if args.book and args.position is not None:
+        with BookBundle(bundle_path(args.book)) as bundle:
+            hit = bundle.summary_at(args.position)
+            print(f"[{hit[0]}] {hit[1]}" if hit else "No summary available for this position yet.")
+        return
+
+    exporter = BundleExporter()
+
+    try:
+        await exporter.connect()
+        if args.book:
+            await exporter.export_book(args.book)
+        else:
+            await exporter.export_all_books()
+    finally:
+        await exporter.disconnect()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
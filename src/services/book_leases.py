@@ -0,0 +1,156 @@
+import os
+import uuid
+import socket
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = int(os.getenv('BOOK_LEASE_SECONDS', 300))
+
+# Take a lease that is free, expired, or already ours, unless this run finished the book
+CLAIM_LEASE_SQL = """
+INSERT INTO "BookLease" ("bookId", "kind", "owner", "expiresAt")
+VALUES ($1, $2, $3, NOW() AT TIME ZONE 'UTC' + make_interval(secs => $4))
+ON CONFLICT ("bookId", "kind") DO UPDATE
+SET "owner" = EXCLUDED."owner", "expiresAt" = EXCLUDED."expiresAt"
+WHERE ("BookLease"."expiresAt" < NOW() AT TIME ZONE 'UTC' OR "BookLease"."owner" = EXCLUDED."owner")
+  AND "BookLease"."completedRun" IS DISTINCT FROM $5
+RETURNING "owner"
+"""
+
+RENEW_LEASE_SQL = """
+UPDATE "BookLease"
+SET "expiresAt" = NOW() AT TIME ZONE 'UTC' + make_interval(secs => $4)
+WHERE "bookId" = $1 AND "kind" = $2 AND "owner" = $3
+"""
+
+COMPLETE_LEASE_SQL = """
+UPDATE "BookLease"
+SET "completedRun" = $4, "expiresAt" = NOW() AT TIME ZONE 'UTC'
+WHERE "bookId" = $1 AND "kind" = $2 AND "owner" = $3
+"""
+
+RELEASE_LEASE_SQL = """
+UPDATE "BookLease"
+SET "expiresAt" = NOW() AT TIME ZONE 'UTC'
+WHERE "bookId" = $1 AND "kind" = $2 AND "owner" = $3
+"""
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse an "i/N" shard spec into (index, count)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}', expected 0 <= i < N")
+    return index, count
+
+def in_shard(book_id: str, shard: Optional[Tuple[int, int]]) -> bool:
+    """Whether a book belongs to a static shard, by a stable hash of its id"""
+    if shard is None:
+        return True
+    index, count = shard
+    return int(hashlib.sha1(book_id.encode('utf-8')).hexdigest()[:8], 16) % count == index
+
+class LeaseManager:
+    """Expiring per-book leases so several workers can share one processing run.
+
+    A worker claims a book before processing it and renews the lease while it
+    works; if it crashes, the lease expires and another worker takes the book
+    over. Completing a book records the run id so no other worker of the same
+    run picks it up again.
+    """
+
+    def __init__(self, db: Prisma, kind: str, run_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.db = db
+        self.kind = kind
+        self.run_id = run_id
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    async def claim(self, book_id: str) -> bool:
+        """Try to take the lease on a book"""
+        rows = await self.db.query_raw(CLAIM_LEASE_SQL, book_id, self.kind, self.owner, self.lease_seconds, self.run_id)
+        return bool(rows)
+
+    async def renew(self, book_id: str) -> bool:
+        """Extend a lease we hold; False if it was lost to another worker"""
+        updated = await self.db.execute_raw(RENEW_LEASE_SQL, book_id, self.kind, self.owner, self.lease_seconds)
+        return updated > 0
+
+    async def complete(self, book_id: str) -> bool:
+        """Mark a book done for this run and let the lease go; False if it was no longer ours"""
+        updated = await self.db.execute_raw(COMPLETE_LEASE_SQL, book_id, self.kind, self.owner, self.run_id)
+        return updated > 0
+
+    async def release(self, book_id: str):
+        """Give up a lease without completing, so another worker can retry"""
+        await self.db.execute_raw(RELEASE_LEASE_SQL, book_id, self.kind, self.owner)
+
+    async def _keep_alive(self, book_id: str, worker: asyncio.Task, lost: asyncio.Event):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self.renew(book_id):
+                    logger.warning(f"Lost lease on book {book_id}; stopping work on it")
+                    lost.set()
+                    worker.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"Error renewing lease on book {book_id}: {str(e)}")
+
+    async def run(self, book_id: str, work: Callable[[], Awaitable[Any]]) -> bool:
+        """Claim a book and run work on it, renewing the lease in the background.
+
+        Returns False without running work if the book could not be claimed.
+        The book is completed if work returns and released for a retry if it
+        raises. If the lease is lost, work is cancelled, so nothing more is
+        written for a book another worker now owns, and the book is left for
+        that worker to finish.
+        """
+        if not await self.claim(book_id):
+            return False
+
+        # Work runs in its own task so losing the lease can cancel just that
+        worker = asyncio.create_task(work())
+        lost = asyncio.Event()
+        renewer = asyncio.create_task(self._keep_alive(book_id, worker, lost))
+        try:
+            await worker
+        except asyncio.CancelledError:
+            if not lost.is_set():
+                await self.release(book_id)
+                raise
+            return True
+        except BaseException:
+            await self.release(book_id)
+            raise
+        finally:
+            renewer.cancel()
+        if lost.is_set() or not await self.complete(book_id):
+            logger.warning(f"Not completing book {book_id}: its lease was lost")
+        return True
+
+def add_run_arguments(parser):
+    """Command-line options shared by the sharded processing scripts"""
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="only process books whose id hashes to shard i of N, e.g. 0/4")
+    parser.add_argument('--lease', action='store_true',
+                        help="claim books through expiring leases so several workers can share a run")
+    parser.add_argument('--run-id', default=os.getenv('BOOK_RUN_ID'),
+                        help="shared by all workers of a run; a book completed in the run is never repeated")
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="lease duration; renewed every third of it while working")
+
+def leases_from_args(db: Prisma, kind: str, args) -> Optional[LeaseManager]:
+    """Build a lease manager if lease mode was requested"""
+    if not args.lease:
+        return None
+    if not args.run_id:
+        raise ValueError("--lease requires a --run-id (or BOOK_RUN_ID) shared by all workers of the run")
+    return LeaseManager(db, kind, args.run_id, args.lease_seconds)
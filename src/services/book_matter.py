@@ -0,0 +1,202 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from parsed_artifacts import ParsedItem
+
+# Gutenberg license header ends at (and includes) one of these paragraphs
+HEADER_END = re.compile(
+    r"\*\*\*\s*START OF (THE|THIS) PROJECT GUTENBERG E-?BOOK"
+    r"|\*\s*END\s*\*?\s*THE SMALL PRINT",
+    re.IGNORECASE
+)
+# Gutenberg license footer starts at one of these paragraphs
+FOOTER_START = re.compile(
+    r"\*\*\*\s*END OF (THE|THIS) PROJECT GUTENBERG E-?BOOK"
+    r"|^End of (the )?Project Gutenberg('s)? (E-?(Book|text)|Etext)",
+    re.IGNORECASE
+)
+TRANSCRIBER_NOTE = re.compile(r"^\[?\s*transcriber['’]?s? notes?\b", re.IGNORECASE)
+CREDITS = re.compile(r"^(produced|prepared|e-?text prepared) by\b", re.IGNORECASE)
+CONTENTS_HEADING = re.compile(r"^(table of )?contents\.?$", re.IGNORECASE)
+INDEX_HEADING = re.compile(r"^index\.?$", re.IGNORECASE)
+TOC_HREF = re.compile(r"(^|[/_.-])(toc|nav|contents)([/_.-]|$)", re.IGNORECASE)
+
+# Front matter is only looked for in this leading share of the book, back matter in the trailing one
+FRONT_SHARE = 0.15
+BACK_SHARE = 0.2
+# Contents entries are short lines; a longer paragraph means the text has started
+MAX_ENTRY_WORDS = 12
+# Verse and drama are short lines too, so a contents run is also capped in length
+MAX_CONTENTS_ENTRIES = 150
+# Lines that are recognisably list entries: a trailing page number, or a chapter-style label
+LISTED_LINE = re.compile(
+    r"\d+\s*$"
+    r"|^(chapter|part|book|volume|act|scene|canto|letter|section)\b"
+    r"|^([IVXLC]+|\d+)\.(\s|$)",
+    re.IGNORECASE
+)
+
+Exclusion = Dict[str, Any]
+
+def _lines(paragraph: str) -> List[str]:
+    return [line for line in paragraph.split('\n') if line.strip()]
+
+def _looks_like_entry(paragraph: str, word_count: int) -> bool:
+    lines = _lines(paragraph)
+    return bool(lines) and all(len(line.split()) <= MAX_ENTRY_WORDS for line in lines) and word_count <= MAX_ENTRY_WORDS * len(lines)
+
+def _looks_listed(paragraph: str) -> bool:
+    lines = _lines(paragraph)
+    return bool(lines) and sum(bool(LISTED_LINE.search(line.strip())) for line in lines) >= 0.6 * len(lines)
+
+def _looks_like_index(paragraph: str) -> bool:
+    lines = _lines(paragraph)
+    # Index lines end in page numbers: "Bennet, Mr., 12, 45-47"
+    return bool(lines) and sum(bool(re.search(r'\d[\d,.\s–-]*$', line)) for line in lines) >= 0.6 * len(lines)
+
+class MatterDetector:
+    """Finds front and back matter in a book's paragraph stream.
+
+    Uses the Project Gutenberg license markers where present, and otherwise
+    cheap heuristics for transcriber notes, credits, tables of contents and
+    back-of-book indexes. Only paragraph ranges are reported; deciding what
+    to do with them is left to the caller.
+    """
+
+    def detect(self, parsed_items: List[ParsedItem]) -> List[Exclusion]:
+        """Excluded ranges as {"kind", "item", "from", "to"}, with paragraph indexes [from, to)"""
+        flat = [
+            (item_index, paragraph_index, text, count)
+            for item_index, (_, paragraphs) in enumerate(parsed_items)
+            for paragraph_index, (text, count) in enumerate(paragraphs)
+        ]
+        if not flat:
+            return []
+
+        total_words = sum(count for _, _, _, count in flat)
+        offsets = []
+        position = 0
+        for _, _, _, count in flat:
+            offsets.append(position)
+            position += count
+
+        excluded: List[Optional[str]] = [None] * len(flat)
+
+        # License header and footer, by marker
+        header_end = next((i for i, (_, _, text, _) in enumerate(flat) if HEADER_END.search(text)), None)
+        if header_end is not None:
+            for i in range(header_end + 1):
+                excluded[i] = 'license'
+        footer_start = next(
+            (i for i, (_, _, text, _) in enumerate(flat)
+             if (header_end is None or i > header_end) and FOOTER_START.search(text.strip())),
+            None
+        )
+        if footer_start is not None:
+            for i in range(footer_start, len(flat)):
+                excluded[i] = 'license'
+
+        body_start = header_end + 1 if header_end is not None else 0
+        body_end = footer_start if footer_start is not None else len(flat)
+        body_words = max(sum(count for _, _, _, count in flat[body_start:body_end]), 1)
+        front_limit = offsets[body_start] + FRONT_SHARE * body_words if body_start < len(flat) else total_words
+        back_limit = offsets[body_end - 1] - BACK_SHARE * body_words if body_end > 0 else 0
+
+        # Navigation documents are all table of contents
+        for i, (item_index, _, _, _) in enumerate(flat):
+            if excluded[i] is None and TOC_HREF.search(parsed_items[item_index][0]):
+                excluded[i] = 'contents'
+
+        i = body_start
+        while i < body_end and offsets[i] <= front_limit:
+            _, _, text, count = flat[i]
+            stripped = text.strip()
+            if excluded[i] is not None:
+                i += 1
+            elif TRANSCRIBER_NOTE.match(stripped) or CREDITS.match(stripped):
+                excluded[i] = 'notes'
+                i += 1
+            elif CONTENTS_HEADING.match(stripped):
+                i = self._mark_contents(flat, excluded, i, body_end, offsets, front_limit)
+            else:
+                i += 1
+
+        # A trailing index runs from its heading to the end of the body
+        for i in range(body_end - 1, body_start - 1, -1):
+            if offsets[i] < back_limit:
+                break
+            if excluded[i] is None and INDEX_HEADING.match(flat[i][2].strip()):
+                following = [text for _, _, text, _ in flat[i + 1:body_end]]
+                if following and sum(_looks_like_index(text) for text in following) >= 0.6 * len(following):
+                    for j in range(i, body_end):
+                        excluded[j] = excluded[j] or 'index'
+                break
+
+        # Transcriber notes also turn up at the end
+        for i in range(body_start, body_end):
+            if excluded[i] is None and offsets[i] >= back_limit and TRANSCRIBER_NOTE.match(flat[i][2].strip()):
+                excluded[i] = 'notes'
+
+        return self._ranges(flat, excluded)
+
+    @staticmethod
+    def _mark_contents(flat, excluded: List[Optional[str]], heading: int, body_end: int,
+                       offsets: List[int], front_limit: float) -> int:
+        """Mark a contents heading and its entries, returning the first paragraph after them"""
+        excluded[heading] = 'contents'
+        first_entry: Optional[str] = None
+        i = heading + 1
+        # Never run past the front of the book, however short its lines are
+        while i < body_end and i - heading <= MAX_CONTENTS_ENTRIES and offsets[i] <= front_limit:
+            _, _, text, count = flat[i]
+            lines = _lines(text)
+            entry = lines[0].strip().lower() if lines else ''
+            # The body starts where the first listed entry appears again, or with real prose
+            if not _looks_like_entry(text, count) or (first_entry is not None and entry == first_entry):
+                break
+            # Past the first entry, only paragraphs that are plainly list entries continue
+            # the run; short lines alone could as well be the verse or drama that follows
+            if first_entry is not None and not _looks_listed(text):
+                break
+            if first_entry is None:
+                first_entry = entry
+            excluded[i] = 'contents'
+            i += 1
+        return i
+
+    @staticmethod
+    def _ranges(flat, excluded: List[Optional[str]]) -> List[Exclusion]:
+        ranges: List[Exclusion] = []
+        for (item_index, paragraph_index, _, _), kind in zip(flat, excluded):
+            if kind is None:
+                continue
+            last = ranges[-1] if ranges else None
+            if last and last['kind'] == kind and last['item'] == item_index and last['to'] == paragraph_index:
+                last['to'] = paragraph_index + 1
+            else:
+                ranges.append({"kind": kind, "item": item_index, "from": paragraph_index, "to": paragraph_index + 1})
+        return ranges
+
+def strip_boilerplate(text: str, kinds: Tuple[str, ...] = ('license',)) -> Tuple[str, List[Dict[str, Any]]]:
+    """Remove front and back matter of the given kinds from a plain-text book.
+
+    Only the marker-delimited license header and footer by default: the other
+    kinds are heuristic, and are better excluded (and recorded) at processing
+    time than deleted from the text for good. Returns the remaining text and
+    what was removed, as {"kind", "words"}.
+    """
+    paragraphs = [paragraph for paragraph in re.split(r'\n\s*\n', text.replace('\r\n', '\n')) if paragraph.strip()]
+    parsed = [(paragraph, len(paragraph.split())) for paragraph in paragraphs]
+    exclusions = MatterDetector().detect([('text', parsed)])
+
+    dropped = set()
+    removed = []
+    for exclusion in exclusions:
+        if exclusion['kind'] not in kinds:
+            continue
+        dropped.update(range(exclusion['from'], exclusion['to']))
+        removed.append({
+            "kind": exclusion['kind'],
+            "words": sum(count for _, count in parsed[exclusion['from']:exclusion['to']])
+        })
+    kept = [paragraph for index, paragraph in enumerate(paragraphs) if index not in dropped]
+    return '\n\n'.join(kept), removed
@@ -0,0 +1,277 @@
+import os
+import json
+import heapq
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from config import data_path
+from search_index import PositionalIndexBuilder, terms_for_word
+from recall_index import RecallIndexBuilder
+from location_map import LocationMapBuilder
+from parsed_artifacts import ParsedItem
+
+# Capitalized words that are rarely names even mid-sentence (often after dialogue)
+MENTION_STOPWORDS = {'he', 'she', 'it', 'they', 'we', 'you', 'his', 'her', 'the', 'and', 'but', 'mr', 'mrs', 'miss', 'sir'}
+
+class ScannedParagraph:
+    """One paragraph as seen by every analyzer of a scan.
+
+    Words are split once; normalized terms are computed on first use and then
+    shared, so several term-based analyzers cost one tokenization between them.
+    """
+
+    __slots__ = ('href', 'text', 'words', 'start', '_terms')
+
+    def __init__(self, href: str, text: str, words: List[str], start: int):
+        self.href = href
+        self.text = text
+        self.words = words
+        self.start = start
+        self._terms: Optional[List[List[str]]] = None
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.words)
+
+    @property
+    def terms(self) -> List[List[str]]:
+        """Index terms of each word, in word order"""
+        if self._terms is None:
+            self._terms = [terms_for_word(word) for word in self.words]
+        return self._terms
+
+class Analyzer:
+    """Base for passes that run inside a BookScan; override what you need"""
+
+    name = 'analyzer'
+
+    def begin_item(self, href: str, start: int):
+        """A spine item starts at word offset start"""
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        """The next paragraph, in reading order"""
+
+    def excluded(self, paragraph: ScannedParagraph, kind: str):
+        """A paragraph left out of the text (front or back matter); it takes up no word offsets"""
+
+    def end_item(self, href: str, end: int):
+        """The current spine item ended at word offset end"""
+
+    def finish(self) -> Any:
+        """This analyzer's result, once the whole book has been seen"""
+        return None
+
+class BookScan:
+    """Drives any number of analyzers with one pass over a book's paragraph stream"""
+
+    def __init__(self, analyzers: List[Analyzer]):
+        names = [analyzer.name for analyzer in analyzers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Analyzer names must be unique: {names}")
+        self.analyzers = analyzers
+
+    def run(self, parsed_items: List[ParsedItem], exclusions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Feed every paragraph to every analyzer and collect their results by name.
+
+        Paragraphs in exclusions ({"kind", "item", "from", "to"} ranges, as found
+        by MatterDetector) are reported through Analyzer.excluded instead.
+        """
+        excluded = {
+            (exclusion['item'], index): exclusion['kind']
+            for exclusion in exclusions or []
+            for index in range(exclusion['from'], exclusion['to'])
+        }
+        position = 0
+        for item_index, (href, paragraphs) in enumerate(parsed_items):
+            for analyzer in self.analyzers:
+                analyzer.begin_item(href, position)
+            for paragraph_index, (text, _) in enumerate(paragraphs):
+                paragraph = ScannedParagraph(href, text, text.split(), position)
+                kind = excluded.get((item_index, paragraph_index))
+                if kind is not None:
+                    for analyzer in self.analyzers:
+                        analyzer.excluded(paragraph, kind)
+                    continue
+                for analyzer in self.analyzers:
+                    analyzer.paragraph(paragraph)
+                position = paragraph.end
+            for analyzer in self.analyzers:
+                analyzer.end_item(href, position)
+        return {analyzer.name: analyzer.finish() for analyzer in self.analyzers}
+
+class SectionAnalyzer(Analyzer):
+    """Groups paragraphs into sections of about max_words, never across spine items.
+
+    Result: [(content, start, end), ...] in reading order.
+    """
+
+    name = 'sections'
+
+    def __init__(self, max_words: int):
+        self.max_words = max_words
+        self.sections: List[Tuple[str, int, int]] = []
+        self.current: List[str] = []
+        self.current_start = 0
+        self.current_words = 0
+
+    def _flush(self):
+        if self.current:
+            self.sections.append(('\n\n'.join(self.current), self.current_start, self.current_start + self.current_words))
+        self.current = []
+        self.current_words = 0
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        # If adding this paragraph would exceed the target size, start a new section
+        if self.current_words + len(paragraph.words) > self.max_words and self.current_words > 0:
+            self._flush()
+        if not self.current:
+            self.current_start = paragraph.start
+        self.current.append(paragraph.text)
+        self.current_words += len(paragraph.words)
+
+    def end_item(self, href: str, end: int):
+        self._flush()
+
+    def finish(self) -> List[Tuple[str, int, int]]:
+        self._flush()
+        return self.sections
+
+class SearchIndexAnalyzer(Analyzer):
+    """Positional search index; result is a PositionalIndex"""
+
+    name = 'search_index'
+
+    def __init__(self, book_id: str):
+        self.builder = PositionalIndexBuilder(book_id)
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        self.builder.add_terms(paragraph.terms, paragraph.start)
+
+    def finish(self):
+        return self.builder.build()
+
+class RecallAnalyzer(Analyzer):
+    """Passage embeddings for position-bounded recall; result is a RecallIndex"""
+
+    name = 'recall_index'
+
+    def __init__(self, book_id: str):
+        self.builder = RecallIndexBuilder(book_id)
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        self.builder.add_terms(paragraph.terms, paragraph.start)
+
+    def finish(self):
+        return self.builder.build()
+
+class LocationAnalyzer(Analyzer):
+    """Reader location to word offset map; result is the map document"""
+
+    name = 'location_map'
+
+    def __init__(self):
+        self.builder = LocationMapBuilder()
+        self.item_start = 0
+        self.counts: List[int] = []
+
+    def begin_item(self, href: str, start: int):
+        self.item_start = start
+        self.counts = []
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        self.counts.append(len(paragraph.words))
+
+    def excluded(self, paragraph: ScannedParagraph, kind: str):
+        # Keep the paragraph's slot so reader paragraph indexes still line up
+        self.builder.add_exclusion(kind, paragraph.href, len(self.counts), len(paragraph.words), paragraph.start)
+        self.counts.append(0)
+
+    def end_item(self, href: str, end: int):
+        self.builder.add_item(href, self.counts, self.item_start)
+
+    def finish(self) -> Dict[str, Any]:
+        return self.builder.build()
+
+class MentionCounter(Analyzer):
+    """Counts capitalized words that do not start a sentence, as character and place candidates.
+
+    Result: [{"name", "count", "first"}, ...] for the most frequent names.
+    """
+
+    name = 'mentions'
+
+    def __init__(self, top: int = 50, min_count: int = 3):
+        self.top = top
+        self.min_count = min_count
+        self.counts: Counter = Counter()
+        self.first: Dict[str, int] = {}
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        sentence_start = True
+        for offset, word in enumerate(paragraph.words, paragraph.start):
+            stripped = word.strip('"\'“”‘’()[]_*')
+            name = stripped.rstrip('.,;:!?')
+            if (not sentence_start and len(name) > 1 and name[0].isupper() and name[1:].islower()
+                    and name.isalpha() and name.lower() not in MENTION_STOPWORDS):
+                self.counts[name] += 1
+                self.first.setdefault(name, offset)
+            sentence_start = stripped.endswith(('.', '!', '?'))
+
+    def finish(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": name, "count": count, "first": self.first[name]}
+            for name, count in self.counts.most_common(self.top)
+            if count >= self.min_count
+        ]
+
+class ShingleSigner(Analyzer):
+    """Bottom-k MinHash signature over word shingles, for spotting duplicate editions.
+
+    Two books' Jaccard similarity is estimated from the overlap of their
+    signatures. Result: the k smallest shingle hashes, ascending.
+    """
+
+    name = 'signature'
+
+    def __init__(self, shingle_words: int = 5, k: int = 128):
+        self.shingle_words = shingle_words
+        self.k = k
+        # Max-heap (negated) of the k smallest distinct hashes seen
+        self.heap: List[int] = []
+        self.members = set()
+        self.window: List[str] = []
+
+    def paragraph(self, paragraph: ScannedParagraph):
+        for terms in paragraph.terms:
+            for term in terms:
+                self.window.append(term)
+                if len(self.window) > self.shingle_words:
+                    del self.window[0]
+                if len(self.window) == self.shingle_words:
+                    self._offer(zlib.crc32(' '.join(self.window).encode('utf-8')))
+
+    def _offer(self, value: int):
+        if value in self.members:
+            return
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, -value)
+            self.members.add(value)
+        elif value < -self.heap[0]:
+            self.members.discard(-heapq.heappushpop(self.heap, -value))
+            self.members.add(value)
+
+    def finish(self) -> List[int]:
+        return sorted(-value for value in self.heap)
+
+def stats_path(book_id: str) -> str:
+    """Where the small per-book analysis results are kept"""
+    return data_path('book_stats', f"{book_id}.json")
+
+def save_stats(book_id: str, stats: Dict[str, Any]) -> str:
+    """Persist JSON-serializable scan results of a book"""
+    path = stats_path(book_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,71 @@
+import re
+from typing import List
+
+# Words (with internal apostrophes/hyphens) or single punctuation marks
+PIECE_PATTERN = re.compile(r"[^\W_]+(?:['’\-][^\W_]+)*|[^\w\s]")
+
+# Sentence ends: terminal punctuation, optionally followed by a closing quote or bracket
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"'’”)\]])\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the subword token count of a text.
+
+    Common short words are a single BPE token; longer words are split into
+    roughly one extra token per four characters, and punctuation marks are
+    tokens of their own. This tends to slightly overestimate, which is the
+    safe direction for packing.
+    """
+    tokens = 0
+    for piece in PIECE_PATTERN.findall(text):
+        tokens += 1 + max(0, len(piece) - 6) // 4
+    return tokens
+
+def split_sentences(text: str) -> List[str]:
+    """Split text on sentence boundaries, dropping empty pieces"""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    """Hard-split a single sentence that exceeds the budget on word boundaries"""
+    pieces = []
+    current: List[str] = []
+    current_tokens = 0
+    for word in sentence.split():
+        word_tokens = estimate_tokens(word)
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+            current_tokens = 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def pack_chunks(text: str, max_tokens: int) -> List[str]:
+    """Greedily pack whole sentences into chunks of at most max_tokens"""
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in split_sentences(text):
+        sentence_tokens = estimate_tokens(sentence)
+        if sentence_tokens > max_tokens:
+            if current:
+                chunks.append(" ".join(current))
+                current = []
+                current_tokens = 0
+            chunks.extend(_split_long_sentence(sentence, max_tokens))
+            continue
+
+        if current and current_tokens + sentence_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current = []
+            current_tokens = 0
+        current.append(sentence)
+        current_tokens += sentence_tokens
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
@@ -0,0 +1,17 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Root directory for locally persisted artifacts (indexes, caches, bundles)
+DATA_DIR = os.getenv(
+    'READRECALL_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+)
+
+def data_path(*parts: str) -> str:
+    """Return a path under the data directory, creating its parent directories"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,234 @@
+import os
+import json
+import tarfile
+import argparse
+import xml.etree.ElementTree as ET
+from typing import IO, Any, Dict, Iterator, List, Optional, Set
+from dotenv import load_dotenv
+from config import data_path
+
+# Load environment variables
+load_dotenv()
+
+# Offline catalog dump: https://www.gutenberg.org/cache/epub/feeds/rdf-files.tar.bz2
+CATALOG_PATH = os.getenv('GUTENBERG_CATALOG_PATH', 'rdf-files.tar.bz2')
+BATCH_SIZE = int(os.getenv('GUTENBERG_BATCH_SIZE', 25))
+
+RDF = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+DCTERMS = '{http://purl.org/dc/terms/}'
+PGTERMS = '{http://www.gutenberg.org/2009/pgterms/}'
+
+def cursor_path() -> str:
+    """Where the highest catalog id already fed to the uploader is kept"""
+    return data_path('gutenberg_catalog', 'cursor.json')
+
+def load_cursor() -> int:
+    """Highest ebook id seen by the last complete catalog run"""
+    path = cursor_path()
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f).get('lastId', 0)
+
+def save_cursor(last_id: int):
+    """Record the highest ebook id seen so later runs only pick up newer entries"""
+    path = cursor_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'lastId': last_id}, f)
+    os.replace(tmp_path, path)
+
+def uploaded_ids_path() -> str:
+    """Where the ids of books already uploaded from the catalog are kept, one per line"""
+    return data_path('gutenberg_catalog', 'uploaded.txt')
+
+def load_uploaded_ids() -> Set[int]:
+    """Ids uploaded by earlier runs, including limited and interrupted ones"""
+    path = uploaded_ids_path()
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {int(line) for line in f if line.strip()}
+
+def record_uploaded_ids(ids: List[int]):
+    """Remember uploaded ids so no later run uploads them again"""
+    with open(uploaded_ids_path(), 'a') as f:
+        f.writelines(f"{book_id}\n" for book_id in ids)
+
+def display_name(agent_name: str) -> str:
+    """Turn a catalog name like "Austen, Jane" into "Jane Austen\""""
+    parts = [part.strip() for part in agent_name.split(',')]
+    if len(parts) == 2 and parts[1] and not parts[1][0].isdigit():
+        return f"{parts[1]} {parts[0]}"
+    return agent_name.strip()
+
+def _values(element: ET.Element, path: str) -> List[str]:
+    return [value.text.strip() for value in element.iterfind(path) if value.text]
+
+def parse_rdf(stream: IO[bytes]) -> Optional[Dict[str, Any]]:
+    """Extract one catalog entry from an RDF/XML file, element by element"""
+    entry = None
+    for _, element in ET.iterparse(stream, events=('end',)):
+        if element.tag != f'{PGTERMS}ebook':
+            continue
+        about = element.get(f'{RDF}about', '')
+        if not about.startswith('ebooks/'):
+            continue
+        downloads = element.findtext(f'{PGTERMS}downloads')
+        entry = {
+            'id': int(about.split('/', 1)[1]),
+            'title': ' '.join((element.findtext(f'{DCTERMS}title') or '').split()),
+            'authors': [display_name(name) for name in _values(element, f'{DCTERMS}creator/{PGTERMS}agent/{PGTERMS}name')],
+            'languages': _values(element, f'{DCTERMS}language/{RDF}Description/{RDF}value'),
+            'subjects': _values(element, f'{DCTERMS}subject/{RDF}Description/{RDF}value'),
+            'type': (element.findtext(f'{DCTERMS}type/{RDF}Description/{RDF}value') or '').strip(),
+            'rights': (element.findtext(f'{DCTERMS}rights') or '').strip(),
+            'downloads': int(downloads) if downloads and downloads.isdigit() else 0
+        }
+        element.clear()
+    return entry
+
+def iter_catalog(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream every entry of a catalog dump, a .tar(.bz2) archive or an extracted directory.
+
+    Archives are read sequentially and directories walked lazily, so only one
+    RDF file is held in memory at a time however large the catalog is.
+    """
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in files:
+                if name.endswith('.rdf'):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        entry = parse_rdf(f)
+                    if entry:
+                        yield entry
+        return
+
+    with tarfile.open(path, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith('.rdf'):
+                continue
+            f = archive.extractfile(member)
+            if f is None:
+                continue
+            entry = parse_rdf(f)
+            if entry:
+                yield entry
+
+class CatalogFilter:
+    """Which catalog entries to upload"""
+
+    def __init__(self, languages: Optional[List[str]] = None, subjects: Optional[List[str]] = None,
+                 min_downloads: int = 0, public_domain_only: bool = True):
+        self.languages = set(languages or [])
+        self.subjects = [subject.lower() for subject in subjects or []]
+        self.min_downloads = min_downloads
+        self.public_domain_only = public_domain_only
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        """Whether an entry is a readable text passing every configured filter"""
+        if entry['type'] and entry['type'] != 'Text':
+            return False
+        if not entry['title'] or not entry['authors']:
+            return False
+        if self.languages and not self.languages.intersection(entry['languages']):
+            return False
+        if self.subjects and not any(
+            wanted in subject.lower() for subject in entry['subjects'] for wanted in self.subjects
+        ):
+            return False
+        if entry['downloads'] < self.min_downloads:
+            return False
+        if self.public_domain_only and not entry['rights'].lower().startswith('public domain'):
+            return False
+        return True
+
+def select_books(path: str, catalog_filter: CatalogFilter, after_id: int = 0,
+                 scan: Optional[Dict[str, int]] = None,
+                 skip_ids: Optional[Set[int]] = None) -> Iterator[Dict[str, Any]]:
+    """Uploader-ready books for catalog entries newer than after_id that pass the filter.
+
+    Entries in skip_ids are left out. If given, scan["maxId"] tracks the
+    highest entry id read so far.
+    """
+    for entry in iter_catalog(path):
+        if scan is not None:
+            scan['maxId'] = max(scan.get('maxId', 0), entry['id'])
+        if entry['id'] <= after_id or (skip_ids and entry['id'] in skip_ids):
+            continue
+        if not catalog_filter.matches(entry):
+            continue
+        yield {"id": entry['id'], "title": entry['title'], "author": ' & '.join(entry['authors'])}
+
+def batches(books: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group a stream of books into lists of at most size"""
+    batch = []
+    for book in books:
+        batch.append(book)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload books selected from the Project Gutenberg RDF catalog")
+    parser.add_argument('--catalog', default=CATALOG_PATH, help="rdf-files.tar.bz2 or its extracted directory")
+    parser.add_argument('--language', action='append', help="keep books in this language code, e.g. en (repeatable)")
+    parser.add_argument('--subject', action='append', help="keep books with a subject containing this text (repeatable)")
+    parser.add_argument('--min-downloads', type=int, default=0, help="keep books downloaded at least this often")
+    parser.add_argument('--any-license', action='store_true', help="also keep books not marked public domain")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="books uploaded between result saves")
+    parser.add_argument('--limit', type=int, default=None, help="stop after selecting this many books")
+    parser.add_argument('--from-start', action='store_true', help="ignore the cursor and scan the whole catalog")
+    parser.add_argument('--dry-run', action='store_true', help="list the selected books without uploading")
+    args = parser.parse_args()
+
+    catalog_filter = CatalogFilter(args.language, args.subject, args.min_downloads, not args.any_license)
+    after_id = 0 if args.from_start else load_cursor()
+    print(f"Scanning {args.catalog} for entries after id {after_id}...")
+
+    if not args.dry_run:
+        # Imported here so --dry-run needs neither Cloudinary nor its credentials
+        from upload_books import upload_book, append_results
+
+    scan = {'maxId': after_id}
+    selected = 0
+    uploaded = 0
+    # Books uploaded by limited or interrupted runs are never uploaded (or imported) twice
+    uploaded_ids = load_uploaded_ids()
+    books = select_books(args.catalog, catalog_filter, after_id, scan, uploaded_ids)
+    for batch in batches(books, args.batch_size):
+        if args.limit is not None:
+            batch = batch[:args.limit - selected]
+        selected += len(batch)
+
+        if args.dry_run:
+            for book in batch:
+                print(f"{book['id']}: {book['title']} by {book['author']}")
+        else:
+            results = []
+            done_ids = []
+            for book in batch:
+                result = upload_book(book)
+                if result:
+                    results.append(result)
+                    done_ids.append(book['id'])
+            append_results(results)
+            record_uploaded_ids(done_ids)
+            uploaded_ids.update(done_ids)
+            uploaded += len(results)
+            print(f"✅ Batch done: {len(results)}/{len(batch)} uploaded, {uploaded} so far")
+
+        if args.limit is not None and selected >= args.limit:
+            break
+    else:
+        # Only a complete scan has seen every entry up to the highest id
+        if not args.dry_run:
+            save_cursor(scan['maxId'])
+            print(f"Cursor advanced to id {scan['maxId']}")
+
+    print(f"\n✅ Catalog run complete! {selected} books selected, {uploaded} uploaded")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import hashlib
+from typing import Any, Dict, Optional
+import requests
+from config import data_path
+
+# Cached responses younger than this are served without revalidating
+DEFAULT_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 24 * 60 * 60))
+# Missing URLs (404 and 410) are not retried until this expires
+DEFAULT_NEGATIVE_TTL = int(os.getenv('HTTP_CACHE_NEGATIVE_TTL', 7 * 24 * 60 * 60))
+
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+# Only answers that say the URL does not exist are cached; 403s and 429s are transient
+NEGATIVE_STATUSES = {404, 410}
+
+class CachedResponse:
+    """The subset of requests.Response the fetchers rely on"""
+
+    def __init__(self, status_code: int, content: bytes, encoding: Optional[str], from_cache: bool):
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+class HttpCache:
+    """On-disk HTTP cache with conditional revalidation and negative caching"""
+
+    def __init__(self, root: Optional[str] = None, max_age: int = DEFAULT_MAX_AGE,
+                 negative_ttl: int = DEFAULT_NEGATIVE_TTL):
+        self.root = root or os.path.dirname(data_path('http_cache', 'variants.json'))
+        os.makedirs(os.path.join(self.root, 'entries'), exist_ok=True)
+        self.max_age = max_age
+        self.negative_ttl = negative_ttl
+        self.session = requests.Session()
+        self.variants_path = os.path.join(self.root, 'variants.json')
+        self.variants = self._read_json(self.variants_path) or {}
+
+    def _entry_path(self, url: str, suffix: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'entries', f"{key}.{suffix}")
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, url: str, meta: Dict[str, Any], body: Optional[bytes] = None):
+        if body is not None:
+            self._write_atomic(self._entry_path(url, 'body'), body)
+        self._write_atomic(self._entry_path(url, 'json'), json.dumps(meta).encode('utf-8'))
+
+    def _cached_body(self, url: str) -> Optional[bytes]:
+        path = self._entry_path(url, 'body')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def get(self, url: str, timeout: int = 30) -> CachedResponse:
+        """GET a URL, answering from the cache or revalidating when possible"""
+        meta = self._read_json(self._entry_path(url, 'json'))
+        now = time.time()
+        body = None
+
+        if meta:
+            age = now - meta['fetched_at']
+            if meta['status'] != 200:
+                if meta['status'] in NEGATIVE_STATUSES and age < self.negative_ttl:
+                    return CachedResponse(meta['status'], b'', None, True)
+                meta = None
+            else:
+                body = self._cached_body(url)
+                if body is None:
+                    meta = None
+                elif age < meta.get('max_age', self.max_age):
+                    return CachedResponse(200, body, meta.get('encoding'), True)
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and meta:
+            meta['fetched_at'] = now
+            self._store(url, meta)
+            return CachedResponse(200, body, meta.get('encoding'), True)
+
+        new_meta = {
+            'url': url,
+            'status': response.status_code,
+            'fetched_at': now
+        }
+        if response.status_code == 200:
+            match = MAX_AGE_PATTERN.search(response.headers.get('Cache-Control', ''))
+            new_meta.update({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'encoding': response.encoding or response.apparent_encoding,
+                # The server's freshness lifetime wins, even when it is shorter than ours
+                'max_age': int(match.group(1)) if match else self.max_age
+            })
+            self._store(url, new_meta, response.content)
+            return CachedResponse(200, response.content, new_meta['encoding'], False)
+
+        if response.status_code in NEGATIVE_STATUSES:
+            # Remember URL variants that don't exist; retry everything else
+            self._store(url, new_meta)
+        return CachedResponse(response.status_code, response.content, response.encoding, False)
+
+    def recall(self, key: str) -> Optional[str]:
+        """Return a remembered value, e.g. the URL variant that worked for a book"""
+        return self.variants.get(key)
+
+    def remember(self, key: str, value: str):
+        """Persist a value for later runs"""
+        if self.variants.get(key) == value:
+            return
+        self.variants[key] = value
+        self._write_atomic(self.variants_path, json.dumps(self.variants, indent=2).encode('utf-8'))
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from dotenv import load_dotenv
+from prisma import Prisma
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = os.getenv('LOAD_TEST_BASE_URL', 'http://localhost:3000')
+
+# Endpoints, as reported
+OPEN_BOOK = 'GET /api/books/[id]'
+POST_PROGRESS = 'POST /api/books/[id]/progress'
+GET_SUMMARY = 'GET /api/books/[id]/summary'
+
+PERCENTILES = (50, 90, 95, 99)
+
+class EndpointStats:
+    """Latencies and failures of one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[str, int] = defaultdict(int)
+
+    def record(self, latency: float, status: str, ok: bool):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, float]:
+        """Request count, throughput, error rate and latency percentiles in ms"""
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {
+            "requests": count,
+            "rps": count / elapsed if elapsed > 0 else 0.0,
+            "errorRate": self.errors / count if count else 0.0,
+        }
+        for percentile in PERCENTILES:
+            result[f"p{percentile}"] = latencies[min(count - 1, int(count * percentile / 100))] * 1000 if count else 0.0
+        result["max"] = latencies[-1] * 1000 if count else 0.0
+        return result
+
+class ReadingSession:
+    """One simulated reader turning pages through a book.
+
+    Page turns follow a log-normal reading time around page_seconds; now and
+    then the reader flips back a few pages, skips ahead, or jumps to another
+    part of the book, so positions drift the way real sessions do.
+    """
+
+    def __init__(self, book_id: str, total_words: int, rng: random.Random,
+                 page_words: int, page_seconds: float, summary_rate: float):
+        self.book_id = book_id
+        self.total_words = total_words
+        self.rng = rng
+        self.page_words = page_words
+        self.page_seconds = page_seconds
+        self.summary_rate = summary_rate
+        # Most readers resume somewhere early; a few start fresh
+        self.position = 0 if rng.random() < 0.3 else int(total_words * rng.betavariate(1.2, 3))
+
+    def next_pause(self) -> float:
+        return self.rng.lognormvariate(0, 0.5) * self.page_seconds
+
+    def turn_page(self):
+        roll = self.rng.random()
+        if roll < 0.05:
+            self.position -= self.page_words * self.rng.randint(1, 5)
+        elif roll < 0.08:
+            self.position += self.page_words * self.rng.randint(2, 20)
+        elif roll < 0.085:
+            self.position = self.rng.randrange(self.total_words)
+        else:
+            self.position += int(self.page_words * self.rng.uniform(0.8, 1.2))
+        self.position = max(0, min(self.position, self.total_words - 1))
+
+    def wants_summary(self) -> bool:
+        return self.rng.random() < self.summary_rate
+
+class LoadGenerator:
+    """Replays synthetic reader traffic against a running app and measures it"""
+
+    def __init__(self, books: List[Tuple[str, int]], base_url: str = BASE_URL, users: int = 100,
+                 duration: float = 60, ramp_up: float = 10, page_words: int = 275,
+                 page_seconds: float = 30, summary_rate: float = 0.1, connections: int = 500,
+                 seed: Optional[int] = None):
+        self.books = books
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.page_words = page_words
+        self.page_seconds = page_seconds
+        self.summary_rate = summary_rate
+        self.connections = connections
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.started_at = 0.0
+        self.deadline = 0.0
+        # Popular books get most readers: Zipf-like weights by catalog rank
+        self.weights = [1 / (rank + 1) for rank in range(len(books))]
+
+    async def request(self, http: aiohttp.ClientSession, endpoint: str, method: str, url: str, **kwargs):
+        """Time one request and record it under an endpoint"""
+        start = time.perf_counter()
+        try:
+            async with http.request(method, url, **kwargs) as response:
+                body = await response.read()
+                ok = response.status < 400
+                # The summary route reports its own failures with a 200
+                if ok and endpoint == GET_SUMMARY and b'"id":"error"' in body.replace(b' ', b''):
+                    ok = False
+                self.stats[endpoint].record(time.perf_counter() - start, str(response.status), ok)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats[endpoint].record(time.perf_counter() - start, type(e).__name__, False)
+
+    async def reader(self, http: aiohttp.ClientSession, user: int):
+        """One reader: open a book, then turn pages until the run ends"""
+        await asyncio.sleep(self.ramp_up * user / max(self.users, 1))
+        rng = random.Random(self.rng.random())
+        book_id, total_words = rng.choices(self.books, weights=self.weights)[0]
+        session = ReadingSession(book_id, total_words, rng, self.page_words, self.page_seconds, self.summary_rate)
+        book_url = f"{self.base_url}/api/books/{book_id}"
+
+        await self.request(http, OPEN_BOOK, 'GET', book_url)
+        while time.monotonic() < self.deadline:
+            await asyncio.sleep(min(session.next_pause(), max(self.deadline - time.monotonic(), 0)))
+            if time.monotonic() >= self.deadline:
+                break
+            session.turn_page()
+            await self.request(http, POST_PROGRESS, 'POST', f"{book_url}/progress", json={"position": session.position})
+            if session.wants_summary():
+                await self.request(http, GET_SUMMARY, 'GET', f"{book_url}/summary", params={"position": session.position})
+
+    async def report_progress(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            elapsed = time.monotonic() - self.started_at
+            parts = [
+                f"{endpoint.split()[-1]}: {len(stats.latencies)} req, {stats.errors} err"
+                for endpoint, stats in sorted(self.stats.items())
+            ]
+            logger.info(f"[{elapsed:.0f}s] " + "; ".join(parts))
+
+    async def run(self, report_interval: float = 10) -> Dict[str, Dict[str, float]]:
+        """Run every reader for the configured duration and summarize per endpoint"""
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + self.ramp_up + self.duration
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        timeout = aiohttp.ClientTimeout(total=30)
+        reporter = asyncio.create_task(self.report_progress(report_interval))
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+                await asyncio.gather(*(self.reader(http, user) for user in range(self.users)))
+        finally:
+            reporter.cancel()
+
+        elapsed = time.monotonic() - self.started_at
+        return {endpoint: stats.summary(elapsed) for endpoint, stats in sorted(self.stats.items())}
+
+async def load_books(book_args: Optional[List[str]], limit: int) -> List[Tuple[str, int]]:
+    """(book id, total words) pairs from --book id=words, or the sectioned books in the database"""
+    if book_args:
+        books = []
+        for value in book_args:
+            book_id, _, words = value.partition('=')
+            books.append((book_id, int(words or 100000)))
+        return books
+
+    db = Prisma()
+    await db.connect()
+    try:
+        # Most-read books first, so the Zipf weights follow real popularity
+        rows = await db.query_raw(
+            'SELECT s."bookId", MAX(s."endPosition") AS "totalWords" FROM "BookSection" s '
+            'GROUP BY s."bookId" '
+            'ORDER BY (SELECT COUNT(*) FROM "ReadingState" r WHERE r."bookId" = s."bookId") DESC '
+            'LIMIT $1',
+            limit
+        )
+    finally:
+        await db.disconnect()
+    return [(row['bookId'], int(row['totalWords'])) for row in rows if row['totalWords']]
+
+def print_report(results: Dict[str, Dict[str, float]]):
+    header = f"{'endpoint':<32}{'requests':>10}{'req/s':>9}{'errors':>9}" + ''.join(
+        f"{f'p{percentile}':>9}" for percentile in PERCENTILES
+    ) + f"{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for endpoint, result in results.items():
+        print(
+            f"{endpoint:<32}{result['requests']:>10}{result['rps']:>9.1f}{result['errorRate']:>8.1%} "
+            + ''.join(f"{result[f'p{percentile}']:>9.1f}" for percentile in PERCENTILES)
+            + f"{result['max']:>9.1f}"
+        )
+    print("(latencies in ms)")
+
+async def main():
+    """Main function to run the load generator"""
+    parser = argparse.ArgumentParser(description="Replay synthetic reader traffic against a running app")
+    parser.add_argument('--base-url', default=BASE_URL, help="app to load, e.g. http://localhost:3000")
+    parser.add_argument('--users', type=int, default=100, help="concurrent readers")
+    parser.add_argument('--duration', type=float, default=60, help="seconds to run after ramp-up")
+    parser.add_argument('--ramp-up', type=float, default=10, help="seconds over which readers arrive")
+    parser.add_argument('--page-words', type=int, default=275, help="words per page turn")
+    parser.add_argument('--page-seconds', type=float, default=30,
+                        help="typical seconds between page turns; lower it to compress time")
+    parser.add_argument('--summary-rate', type=float, default=0.1, help="share of page turns that ask for a summary")
+    parser.add_argument('--connections', type=int, default=500, help="maximum open connections")
+    parser.add_argument('--book', action='append', help="book to read as id=totalWords (repeatable; default: from the database)")
+    parser.add_argument('--max-books', type=int, default=200, help="books loaded from the database")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for a reproducible run")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    books = await load_books(args.book, args.max_books)
+    if not books:
+        logger.error("No sectioned books to read; pass --book id=words or process some books first")
+        return
+
+    logger.info(f"Simulating {args.users} readers over {len(books)} books against {args.base_url}")
+    generator = LoadGenerator(
+        books,
+        base_url=args.base_url,
+        users=args.users,
+        duration=args.duration,
+        ramp_up=args.ramp_up,
+        page_words=args.page_words,
+        page_seconds=args.page_seconds,
+        summary_rate=args.summary_rate,
+        connections=args.connections,
+        seed=args.seed
+    )
+    results = await generator.run()
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
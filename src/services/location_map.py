@@ -0,0 +1,70 @@
+from typing import Any, Dict, List
+from prisma import Json
+
+LOCATION_MAP_VERSION = 1
+
+class LocationMapBuilder:
+    """Records where each spine item and paragraph starts in word offsets.
+
+    The map is stored as one small JSON document per book:
+
+        {"version": 1, "totalWords": N,
+         "items": [{"href": "ch1.xhtml", "start": 0, "words": [12, 85, ...]}, ...]}
+
+    "words" holds per-paragraph word counts rather than absolute offsets to keep
+    the payload small; clients rebuild prefix sums once per item and index them.
+
+    Paragraphs left out as front or back matter count zero words and are listed
+    under "excluded" as {"kind", "href", "from", "to", "words", "at"}: the
+    paragraph range of the spine item, how many words it held and the word
+    offset it was cut at.
+    """
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+        self.excluded: List[Dict[str, Any]] = []
+        self.total_words = 0
+
+    def add_item(self, href: str, paragraph_word_counts: List[int], start_position: int):
+        """Record a spine item whose first paragraph starts at start_position"""
+        self.items.append({
+            "href": href,
+            "start": start_position,
+            "words": list(paragraph_word_counts)
+        })
+        self.total_words = max(self.total_words, start_position + sum(paragraph_word_counts))
+
+    def add_exclusion(self, kind: str, href: str, paragraph_index: int, word_count: int, position: int):
+        """Record a paragraph left out of the text at a word offset"""
+        last = self.excluded[-1] if self.excluded else None
+        if last and last["kind"] == kind and last["href"] == href and last["to"] == paragraph_index:
+            last["to"] = paragraph_index + 1
+            last["words"] += word_count
+            return
+        self.excluded.append({
+            "kind": kind,
+            "href": href,
+            "from": paragraph_index,
+            "to": paragraph_index + 1,
+            "words": word_count,
+            "at": position
+        })
+
+    def build(self) -> Dict[str, Any]:
+        """The compact map, ready to be stored"""
+        return {
+            "version": LOCATION_MAP_VERSION,
+            "totalWords": self.total_words,
+            "items": self.items,
+            "excluded": self.excluded
+        }
+
+async def save_location_map(db: Any, book_id: str, location_map: Dict[str, Any]):
+    """Create or replace the stored location map of a book"""
+    await db.booklocationmap.upsert(
+        where={"bookId": book_id},
+        data={
+            "create": {"bookId": book_id, "data": Json(location_map)},
+            "update": {"data": Json(location_map)}
+        }
+    )
@@ -0,0 +1,90 @@
+import os
+import json
+import zlib
+import hashlib
+from typing import List, Optional, Tuple
+from config import data_path
+
+ARTIFACT_FORMAT_VERSION = 1
+
+# (paragraph text, word count)
+Paragraph = Tuple[str, int]
+# (spine item href, its paragraphs in order)
+ParsedItem = Tuple[str, List[Paragraph]]
+
+def epub_hash(content: bytes) -> str:
+    """Content hash identifying an EPUB file"""
+    return hashlib.sha256(content).hexdigest()
+
+class ArtifactStore:
+    """Local store of normalized per-spine-item paragraph streams.
+
+    Artifacts are keyed by EPUB hash and cleaner version, so a book is only
+    downloaded and HTML-parsed again when its file or the cleaning rules
+    change. Each artifact is zlib-compressed JSON holding, per spine item,
+    the href, the paragraph word counts and the paragraphs joined by blank
+    lines (paragraphs never contain one, since that is what split them).
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.dirname(data_path('parsed_artifacts', 'artifacts', '.keep'))
+        os.makedirs(os.path.join(self.root, 'artifacts'), exist_ok=True)
+        os.makedirs(os.path.join(self.root, 'books'), exist_ok=True)
+
+    @staticmethod
+    def key(content_hash: str, cleaner_version: int) -> str:
+        return f"{content_hash}-v{cleaner_version}"
+
+    def _artifact_path(self, key: str) -> str:
+        return os.path.join(self.root, 'artifacts', f"{key}.json.z")
+
+    def _book_path(self, book_id: str) -> str:
+        return os.path.join(self.root, 'books', book_id)
+
+    def load(self, key: str) -> Optional[List[ParsedItem]]:
+        """Parsed items of an artifact, or None if it does not exist"""
+        path = self._artifact_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = json.loads(zlib.decompress(f.read()))
+        if data.get('version') != ARTIFACT_FORMAT_VERSION:
+            return None
+
+        items = []
+        for item in data['items']:
+            paragraphs = item['text'].split('\n\n') if item['words'] else []
+            items.append((item['href'], list(zip(paragraphs, item['words']))))
+        return items
+
+    def save(self, key: str, items: List[ParsedItem]):
+        """Persist parsed items under a key"""
+        data = {
+            'version': ARTIFACT_FORMAT_VERSION,
+            'items': [
+                {
+                    'href': href,
+                    'words': [count for _, count in paragraphs],
+                    'text': '\n\n'.join(paragraph for paragraph, _ in paragraphs)
+                }
+                for href, paragraphs in items
+            ]
+        }
+        path = self._artifact_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'), 6))
+        os.replace(tmp_path, path)
+
+    def link(self, book_id: str, key: str):
+        """Remember which artifact a book was last sectioned from"""
+        with open(self._book_path(book_id), 'w') as f:
+            f.write(key)
+
+    def key_for_book(self, book_id: str) -> Optional[str]:
+        """Artifact key last linked to a book"""
+        path = self._book_path(book_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip() or None
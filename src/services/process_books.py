@@ -1,7 +1,10 @@
 import os
 import json
+import asyncio
 import logging
-from typing import List, Dict, Optional
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import requests
 from dotenv import load_dotenv
@@ -11,6 +14,13 @@ from ebooklib import epub
 from bs4 import BeautifulSoup
 import tempfile
 import re
+from section_storage import SectionStore
+from location_map import save_location_map
+from book_scan import (BookScan, SectionAnalyzer, SearchIndexAnalyzer, RecallAnalyzer, LocationAnalyzer,
+                       MentionCounter, ShingleSigner, save_stats)
+from book_matter import MatterDetector
+from parsed_artifacts import ArtifactStore, ParsedItem, epub_hash
+from book_leases import LeaseManager, add_run_arguments, in_shard, leases_from_args
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +32,77 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Bump whenever clean_html or the paragraph rules change, so stored parsed artifacts are rebuilt
+CLEANER_VERSION = 1
+
+def clean_html(html_content: str) -> str:
+    """Clean HTML content and extract meaningful text while preserving paragraphs"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    # Remove script and style elements
+    for element in soup(['script', 'style']):
+        element.decompose()
+    
+    # Replace paragraph tags with double newlines
+    for p in soup.find_all('p'):
+        p.replace_with('\n\n' + p.get_text() + '\n\n')
+    
+    # Replace other block elements with single newlines
+    for tag in soup.find_all(['div', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        tag.replace_with('\n' + tag.get_text() + '\n')
+    
+    # Get text
+    text = soup.get_text()
+    
+    # Normalize newlines
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    
+    # Remove extra whitespace within lines but preserve paragraph breaks
+    lines = text.split('\n')
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in lines]
+    text = '\n'.join(lines)
+    
+    # Remove any remaining HTML entities
+    text = re.sub(r'&[a-zA-Z]+;', '', text)
+    
+    # Ensure consistent paragraph breaks
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = text.strip()
+    
+    return text
+
+def parse_spine_item(raw_content: bytes) -> List[Tuple[str, int]]:
+    """Turn a raw spine item into (paragraph, word count) pairs.
+    
+    Runs in a worker process when parsing in parallel, so it only takes and
+    returns plain picklable values.
+    """
+    cleaned_content = clean_html(raw_content.decode('utf-8'))
+    
+    # Skip empty or very short sections
+    if not cleaned_content or len(cleaned_content.strip()) < 50:
+        return []
+    
+    # Split content into paragraphs
+    paragraphs = [p for p in cleaned_content.split('\n\n') if p.strip()]
+    return [(paragraph, len(paragraph.split())) for paragraph in paragraphs]
+
 class BookProcessor:
-    def __init__(self):
-        # Initialize Prisma client
-        self.db = Prisma()
+    def __init__(self, workers: Optional[int] = None, db: Optional[Prisma] = None,
+                 max_words_per_section: Optional[int] = None):
+        # Initialize Prisma client (a long-lived worker passes in a shared one)
+        self.db = db or Prisma()
+        self.sections = SectionStore(self.db)
         self.temp_dir = tempfile.mkdtemp()
+        # Pooled HTTP connections for EPUB downloads
+        self.http = requests.Session()
+        # Parsed paragraph streams, so re-sectioning doesn't re-parse EPUBs
+        self.artifacts = ArtifactStore()
+        self.max_words_per_section = max_words_per_section or int(os.getenv('MAX_WORDS_PER_SECTION', 5000))
+        
+        # Parse spine items of a book in parallel when more than one worker is configured
+        self.workers = workers if workers is not None else int(os.getenv('BOOK_PROCESSOR_WORKERS', os.cpu_count() or 1))
+        self.pool: Optional[ProcessPoolExecutor] = None
         
     async def connect(self):
         """Connect to the database"""
@@ -39,7 +115,11 @@ class BookProcessor:
     
     async def disconnect(self):
         """Disconnect from the database"""
-        if self.db:
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        self.http.close()
+        if self.db.is_connected():
             await self.db.disconnect()
             logger.info("Disconnected from database")
     
@@ -49,42 +129,109 @@ class BookProcessor:
     
     def clean_text(self, html_content: str) -> str:
         """Clean HTML content and extract meaningful text while preserving paragraphs"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        return clean_html(html_content)
+    
+    async def parse_spine_items(self, raw_items: List[bytes]) -> List[List[Tuple[str, int]]]:
+        """Parse raw spine items into paragraphs, in spine order"""
+        if self.workers <= 1 or len(raw_items) <= 1:
+            return [parse_spine_item(raw) for raw in raw_items]
         
-        # Remove script and style elements
-        for element in soup(['script', 'style']):
-            element.decompose()
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(self.pool, parse_spine_item, raw)
+            for raw in raw_items
+        ])
+    
+    async def load_parsed_items(self, book) -> Optional[List[ParsedItem]]:
+        """Download a book's EPUB and return its paragraph stream, parsing only on a cache miss"""
+        # Download EPUB file
+        response = self.http.get(book.epubUrl)
+        if response.status_code != 200:
+            logger.error(f"Failed to download EPUB for book {book.id}")
+            return None
         
-        # Replace paragraph tags with double newlines
-        for p in soup.find_all('p'):
-            p.replace_with('\n\n' + p.get_text() + '\n\n')
+        key = self.artifacts.key(epub_hash(response.content), CLEANER_VERSION)
+        parsed_items = self.artifacts.load(key)
+        if parsed_items is not None:
+            logger.info(f"Using parsed artifact {key} for book {book.title}")
+            self.artifacts.link(book.id, key)
+            return parsed_items
         
-        # Replace other block elements with single newlines
-        for tag in soup.find_all(['div', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            tag.replace_with('\n' + tag.get_text() + '\n')
+        # Save to temporary file
+        temp_file = os.path.join(self.temp_dir, f"{book.id}.epub")
+        with open(temp_file, 'wb') as f:
+            f.write(response.content)
         
-        # Get text
-        text = soup.get_text()
+        try:
+            # Read the EPUB file
+            book_epub = epub.read_epub(temp_file)
+        finally:
+            # Clean up temporary file
+            os.remove(temp_file)
         
-        # Normalize newlines
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        # Get spine items (main content)
+        spine_items = list(book_epub.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+        paragraphs = await self.parse_spine_items([item.get_content() for item in spine_items])
+        parsed_items = [(item.get_name(), item_paragraphs) for item, item_paragraphs in zip(spine_items, paragraphs)]
         
-        # Remove extra whitespace within lines but preserve paragraph breaks
-        lines = text.split('\n')
-        lines = [re.sub(r'\s+', ' ', line).strip() for line in lines]
-        text = '\n'.join(lines)
+        self.artifacts.save(key, parsed_items)
+        self.artifacts.link(book.id, key)
+        return parsed_items
+    
+    async def build_sections(self, book, parsed_items: List[ParsedItem]):
+        """Replace a book's sections, indexes and location map from its paragraph stream"""
+        book_id = book.id
         
-        # Remove any remaining HTML entities
-        text = re.sub(r'&[a-zA-Z]+;', '', text)
+        # Leave license text, contents, notes and indexes out of sections and summaries
+        exclusions = MatterDetector().detect(parsed_items)
+        if exclusions:
+            kinds = sorted({exclusion['kind'] for exclusion in exclusions})
+            logger.info(f"Excluding {len(exclusions)} front/back matter ranges ({', '.join(kinds)}) from book {book.title}")
         
-        # Ensure consistent paragraph breaks
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = text.strip()
+        # One pass over the paragraphs feeds every analysis of the book
+        results = BookScan([
+            SectionAnalyzer(self.max_words_per_section),
+            SearchIndexAnalyzer(book_id),
+            RecallAnalyzer(book_id),
+            LocationAnalyzer(),
+            MentionCounter(),
+            ShingleSigner()
+        ]).run(parsed_items, exclusions)
         
-        return text
+        # Replace sections left by an earlier run or by the upload route
+        await self.db.booksection.delete_many(where={"bookId": book_id})
+        
+        for section_index, (section_content, start, end) in enumerate(results['sections']):
+            await self.db.booksection.create({
+                'bookId': book_id,
+                'title': f"Section {section_index + 1}",
+                **self.sections.fields_for(section_content),
+                'orderIndex': section_index,
+                'startPosition': start,
+                'endPosition': end
+            })
+            logger.info(f"Created section {section_index + 1} for book {book.title} with {end - start} words")
+        
+        index_path = results['search_index'].save()
+        logger.info(f"Saved search index for book {book.title} to {index_path}")
+        recall_path = results['recall_index'].save()
+        logger.info(f"Saved recall index for book {book.title} to {recall_path}")
+        
+        # Store the reader location -> word offset map
+        await save_location_map(self.db, book_id, results['location_map'])
+        
+        save_stats(book_id, {"mentions": results['mentions'], "signature": results['signature']})
+        
+        logger.info(f"Completed processing book {book.title} with {len(results['sections'])} sections")
     
-    async def process_book(self, book_id: str):
-        """Process a book and create its sections"""
+    async def process_book(self, book_id: str, raise_errors: bool = False):
+        """Process a book and create its sections.
+        
+        With raise_errors, a missing book, EPUB URL or download raises instead
+        of only being logged, so callers can retry.
+        """
         try:
             # Get book from database
             book = await self.db.book.find_unique(
@@ -93,116 +240,63 @@ class BookProcessor:
             
             if not book:
                 logger.error(f"Book {book_id} not found in database")
+                if raise_errors:
+                    raise ValueError(f"Book {book_id} not found in database")
                 return
             
             if not book.epubUrl:
                 logger.error(f"Book {book_id} has no EPUB URL")
+                if raise_errors:
+                    raise ValueError(f"Book {book_id} has no EPUB URL")
                 return
             
             logger.info(f"Processing book: {book.title}")
             
-            # Download EPUB file
-            response = requests.get(book.epubUrl)
-            if response.status_code != 200:
-                logger.error(f"Failed to download EPUB for book {book_id}")
+            parsed_items = await self.load_parsed_items(book)
+            if parsed_items is None:
+                if raise_errors:
+                    raise RuntimeError(f"Failed to download EPUB for book {book_id}")
                 return
             
-            # Save to temporary file
-            temp_file = os.path.join(self.temp_dir, f"{book_id}.epub")
-            with open(temp_file, 'wb') as f:
-                f.write(response.content)
-            
-            # Read the EPUB file
-            book_epub = epub.read_epub(temp_file)
+            await self.build_sections(book, parsed_items)
             
-            # Get spine items (main content)
-            spine_items = book_epub.get_items_of_type(ebooklib.ITEM_DOCUMENT)
-            
-            # Process each section
-            position = 0
-            section_index = 0
-            max_words_per_section = 5000  # Target size for each section
+        except Exception as e:
+            logger.error(f"Error processing book {book_id}: {str(e)}")
+            raise
+    
+    async def rechunk_book(self, book_id: str, raise_errors: bool = False):
+        """Rebuild a book's sections from its stored parsed artifact, without downloading or parsing"""
+        try:
+            book = await self.db.book.find_unique(
+                where={"id": book_id}
+            )
             
-            for item in spine_items:
-                content = item.get_content().decode('utf-8')
-                logger.info(f"Raw content length: {len(content)}")
-                
-                cleaned_content = self.clean_text(content)
-                logger.info(f"Cleaned content length: {len(cleaned_content)}")
-                
-                # Skip empty or very short sections
-                if not cleaned_content or len(cleaned_content.strip()) < 50:
-                    logger.info("Skipping short section")
-                    continue
-                
-                # Split content into paragraphs
-                paragraphs = [p for p in cleaned_content.split('\n\n') if p.strip()]
-                logger.info(f"Found {len(paragraphs)} paragraphs")
-                
-                current_section = []
-                current_word_count = 0
-                
-                for i, paragraph in enumerate(paragraphs):
-                    paragraph_word_count = self.count_words(paragraph)
-                    logger.info(f"Paragraph {i + 1} has {paragraph_word_count} words")
-                    
-                    # If adding this paragraph would exceed the target size, create a new section
-                    if current_word_count + paragraph_word_count > max_words_per_section and current_word_count > 0:
-                        # Create section with accumulated paragraphs
-                        section_content = '\n\n'.join(current_section)
-                        await self.db.booksection.create({
-                            'bookId': book_id,
-                            'title': f"Section {section_index + 1}",
-                            'content': section_content,
-                            'orderIndex': section_index,
-                            'startPosition': position,
-                            'endPosition': position + current_word_count
-                        })
-                        
-                        logger.info(f"Created section {section_index + 1} for book {book.title} with {current_word_count} words")
-                        
-                        # Reset for next section
-                        position += current_word_count
-                        section_index += 1
-                        current_section = [paragraph]
-                        current_word_count = paragraph_word_count
-                    else:
-                        # Add paragraph to current section
-                        current_section.append(paragraph)
-                        current_word_count += paragraph_word_count
-                
-                # Create final section from remaining paragraphs
-                if current_section:
-                    section_content = '\n\n'.join(current_section)
-                    await self.db.booksection.create({
-                        'bookId': book_id,
-                        'title': f"Section {section_index + 1}",
-                        'content': section_content,
-                        'orderIndex': section_index,
-                        'startPosition': position,
-                        'endPosition': position + current_word_count
-                    })
-                    
-                    logger.info(f"Created section {section_index + 1} for book {book.title} with {current_word_count} words")
-                    position += current_word_count
-                    section_index += 1
+            if not book:
+                logger.error(f"Book {book_id} not found in database")
+                if raise_errors:
+                    raise ValueError(f"Book {book_id} not found in database")
+                return
             
-            # Clean up temporary file
-            os.remove(temp_file)
+            key = self.artifacts.key_for_book(book_id)
+            parsed_items = self.artifacts.load(key) if key else None
+            if parsed_items is None:
+                logger.error(f"No parsed artifact for book {book_id}; process it first")
+                if raise_errors:
+                    raise ValueError(f"No parsed artifact for book {book_id}")
+                return
             
-            logger.info(f"Completed processing book {book.title} with {section_index} sections")
+            logger.info(f"Re-chunking book {book.title} from artifact {key}")
+            await self.build_sections(book, parsed_items)
             
         except Exception as e:
-            logger.error(f"Error processing book {book_id}: {str(e)}")
+            logger.error(f"Error re-chunking book {book_id}: {str(e)}")
             raise
     
-    async def process_all_books(self):
-        """Process all books in the database"""
+    async def process_all_books(self, shard: Optional[Tuple[int, int]] = None, leases: Optional[LeaseManager] = None,
+                                rechunk: bool = False):
+        """Process all books in the database, or this worker's share of them"""
+        handle_book = self.rechunk_book if rechunk else self.process_book
         try:
-            # First, clear existing sections
-            await self.db.booksection.delete_many()
-            logger.info("Cleared existing sections")
-            
             # Get all books with EPUB URLs
             books = await self.db.book.find_many(
                 where={
@@ -213,8 +307,21 @@ class BookProcessor:
             )
             
             for book in books:
-                logger.info(f"Processing book: {book.id}")
-                await self.process_book(book.id)
+                if not in_shard(book.id, shard):
+                    continue
+                
+                if leases is None:
+                    logger.info(f"Processing book: {book.id}")
+                    await handle_book(book.id)
+                    continue
+                
+                # A failed book is released for a retry rather than completed for the run
+                try:
+                    ran = await leases.run(book.id, lambda: handle_book(book.id, raise_errors=True))
+                    if not ran:
+                        logger.info(f"Skipping book {book.id}: claimed by another worker or already done")
+                except Exception as e:
+                    logger.error(f"Released book {book.id} after an error: {str(e)}")
                 
         except Exception as e:
             logger.error(f"Error processing books: {str(e)}")
@@ -222,14 +329,25 @@ class BookProcessor:
 
 async def main():
     """Main function to run the book processor"""
-    processor = BookProcessor()
+    parser = argparse.ArgumentParser(description="Split books into sections")
+    add_run_arguments(parser)
+    parser.add_argument('--rechunk', action='store_true',
+                        help="rebuild sections from stored parsed artifacts instead of downloading EPUBs")
+    parser.add_argument('--max-words', type=int, default=None,
+                        help="target words per section (default MAX_WORDS_PER_SECTION or 5000)")
+    args = parser.parse_args()
+    
+    processor = BookProcessor(max_words_per_section=args.max_words)
     
     try:
         await processor.connect()
-        await processor.process_all_books()
+        await processor.process_all_books(
+            args.shard,
+            leases_from_args(processor.db, 'process_book', args),
+            rechunk=args.rechunk
+        )
     finally:
         await processor.disconnect()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,257 @@
+import os
+import zlib
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from prisma import Prisma
+from config import data_path
+from search_index import terms_for_word
+from section_storage import SectionStore
+from section_cache import SectionCache
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+PASSAGE_WORDS = int(os.getenv('RECALL_PASSAGE_WORDS', 120))
+# Hashed vocabulary size and projected dimensionality
+HASH_FEATURES = 2 ** 14
+VECTOR_DIM = 256
+PROJECTION_SEED = 20250406
+
+_projection: Optional[np.ndarray] = None
+
+def projection_matrix() -> np.ndarray:
+    """Fixed random projection from hashed features to dense vectors"""
+    global _projection
+    if _projection is None:
+        rng = np.random.default_rng(PROJECTION_SEED)
+        _projection = (rng.standard_normal((HASH_FEATURES, VECTOR_DIM)) / np.sqrt(VECTOR_DIM)).astype(np.float32)
+    return _projection
+
+def hashed_features(words: List[str]) -> np.ndarray:
+    """Stable hashed feature ids for the terms of some words"""
+    return hashed_term_features([terms_for_word(word) for word in words])
+
+def hashed_term_features(word_terms: List[List[str]]) -> np.ndarray:
+    """Stable hashed feature ids for already-normalized terms, one list per word"""
+    return np.fromiter(
+        (zlib.crc32(term.encode('utf-8')) % HASH_FEATURES for terms in word_terms for term in terms),
+        dtype=np.int64
+    )
+
+def index_dir(book_id: str) -> str:
+    """Directory holding a book's recall index arrays"""
+    return os.path.dirname(data_path('recall_index', book_id, 'vectors.npy'))
+
+class RecallIndex:
+    """Dense passage vectors of a book, searchable up to a reading position"""
+
+    def __init__(self, book_id: str, vectors: np.ndarray, starts: np.ndarray, ends: np.ndarray, idf: np.ndarray):
+        self.book_id = book_id
+        self.vectors = vectors
+        self.starts = starts
+        self.ends = ends
+        self.idf = idf
+
+    def embed(self, text: str) -> np.ndarray:
+        """Project a query into the passage vector space"""
+        features = hashed_features(text.split())
+        vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+        if features.size == 0:
+            return vector
+        ids, counts = np.unique(features, return_counts=True)
+        weights = (1.0 + np.log(counts)).astype(np.float32) * self.idf[ids]
+        vector = weights @ projection_matrix()[ids]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, query: str, position: int, k: int = 5) -> List[Tuple[int, int, float]]:
+        """Top-k (start, end, score) passages that end at or before position"""
+        # Passages are in reading order, so the readable prefix is a contiguous slice
+        limit = int(np.searchsorted(self.ends, position, side='right'))
+        if limit == 0:
+            return []
+        query_vector = self.embed(query)
+        scores = self.vectors[:limit] @ query_vector
+        k = min(k, limit)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.starts[i]), int(self.ends[i]), float(scores[i])) for i in top]
+
+    def save(self) -> str:
+        """Persist the arrays as .npy files that can be memory-mapped"""
+        directory = index_dir(self.book_id)
+        for name in ('vectors', 'starts', 'ends', 'idf'):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        return directory
+
+    @classmethod
+    def load(cls, book_id: str) -> Optional['RecallIndex']:
+        """Memory-map a persisted index, or None if the book has not been indexed"""
+        directory = index_dir(book_id)
+        if not os.path.exists(os.path.join(directory, 'vectors.npy')):
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+            for name in ('vectors', 'starts', 'ends', 'idf')
+        }
+        return cls(book_id, **arrays)
+
+class RecallIndexBuilder:
+    """Cuts a book into fixed-size passages as its words stream past"""
+
+    def __init__(self, book_id: str, passage_words: int = PASSAGE_WORDS):
+        self.book_id = book_id
+        self.passage_words = passage_words
+        self.passages: List[np.ndarray] = []
+        self.starts: List[int] = []
+        self.lengths: List[int] = []
+        # Normalized terms of the words not yet cut into a passage, one list per word
+        self.pending: List[List[str]] = []
+        self.pending_start = 0
+
+    def add_words(self, words: List[str], start_position: int):
+        """Add words whose first word sits at start_position"""
+        self.add_terms([terms_for_word(word) for word in words], start_position)
+
+    def add_terms(self, word_terms: List[List[str]], start_position: int):
+        """Add already-normalized terms, one list per word, starting at start_position"""
+        if not self.pending:
+            self.pending_start = start_position
+        self.pending.extend(word_terms)
+        while len(self.pending) >= self.passage_words:
+            self._flush(self.passage_words)
+
+    def add_text(self, text: str, start_position: int):
+        """Add a block of text whose first word sits at start_position"""
+        self.add_words(text.split(), start_position)
+
+    def _flush(self, count: int):
+        self.passages.append(hashed_term_features(self.pending[:count]))
+        self.starts.append(self.pending_start)
+        self.lengths.append(count)
+        self.pending = self.pending[count:]
+        self.pending_start += count
+
+    def build(self) -> RecallIndex:
+        """Weight passages by TF-IDF and project them to unit vectors"""
+        if self.pending:
+            self._flush(len(self.pending))
+
+        passage_count = len(self.passages)
+        document_frequency = np.zeros(HASH_FEATURES, dtype=np.float32)
+        unique_features = []
+        for features in self.passages:
+            ids, counts = np.unique(features, return_counts=True)
+            unique_features.append((ids, counts))
+            document_frequency[ids] += 1
+        idf = (np.log((1 + passage_count) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        projection = projection_matrix()
+        vectors = np.zeros((passage_count, VECTOR_DIM), dtype=np.float32)
+        for row, (ids, counts) in enumerate(unique_features):
+            if ids.size == 0:
+                continue
+            weights = (1.0 + np.log(counts)).astype(np.float32) * idf[ids]
+            vectors[row] = weights @ projection[ids]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+
+        starts = np.array(self.starts, dtype=np.int32)
+        ends = starts + np.array(self.lengths, dtype=np.int32)
+        return RecallIndex(self.book_id, vectors, starts, ends, idf)
+
+class RecallIndexer:
+    """Builds recall indexes from stored sections and answers prefix-limited questions"""
+
+    def __init__(self):
+        # Initialize Prisma client
+        self.db = Prisma()
+        self.sections = SectionStore(self.db)
+        self.section_cache = SectionCache(self.sections)
+        self.indexes: Dict[str, RecallIndex] = {}
+
+    async def connect(self):
+        """Connect to the database"""
+        try:
+            await self.db.connect()
+            logger.info("Connected to database successfully")
+        except Exception as e:
+            logger.error(f"Error connecting to database: {str(e)}")
+            raise
+
+    async def disconnect(self):
+        """Disconnect from the database"""
+        if self.db.is_connected():
+            await self.db.disconnect()
+            logger.info("Disconnected from database")
+
+    async def index_book(self, book_id: str) -> Optional[RecallIndex]:
+        """Build and persist the recall index for one book"""
+        book_text = await self.section_cache.get(book_id)
+        if not book_text:
+            logger.warning(f"No sections found for book: {book_id}")
+            return None
+
+        builder = RecallIndexBuilder(book_id)
+        builder.add_text(book_text.text, 0)
+        index = builder.build()
+        directory = index.save()
+        logger.info(f"Indexed {len(index.starts)} passages of book {book_id} -> {directory}")
+        return index
+
+    async def index_all_books(self):
+        """Build recall indexes for every book in the database"""
+        books = await self.db.book.find_many()
+        for book in books:
+            try:
+                await self.index_book(book.id)
+            except Exception as e:
+                logger.error(f"Error indexing book {book.id}: {str(e)}")
+
+    async def recall(self, book_id: str, question: str, position: int, k: int = 5) -> List[Dict]:
+        """Passages before position that best match a question, with their text"""
+        index = self.indexes.get(book_id) or RecallIndex.load(book_id)
+        if index is None:
+            return []
+        self.indexes[book_id] = index
+
+        book_text = await self.section_cache.get(book_id)
+        return [
+            {"start": start, "end": end, "score": score, "text": book_text.words_between(start, end)}
+            for start, end, score in index.search(question, position, k)
+        ]
+
+async def main():
+    """Build recall indexes, or query one with --book/--position/--query"""
+    parser = argparse.ArgumentParser(description="Position-bounded passage recall")
+    parser.add_argument('--book', help="book id to query")
+    parser.add_argument('--position', type=int, help="reading position; only earlier passages are returned")
+    parser.add_argument('--query', help="question to match against passages")
+    parser.add_argument('-k', type=int, default=5, help="number of passages to return")
+    args = parser.parse_args()
+
+    indexer = RecallIndexer()
+
+    try:
+        await indexer.connect()
+        if args.book and args.query is not None and args.position is not None:
+            for hit in await indexer.recall(args.book, args.query, args.position, args.k):
+                print(f"[{hit['start']}-{hit['end']}] {hit['score']:.3f} {hit['text'][:200]}")
+        else:
+            await indexer.index_all_books()
+    finally:
+        await indexer.disconnect()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+import os
+import re
+import struct
+import logging
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from prisma import Prisma
+from config import data_path
+from section_storage import SectionStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+INDEX_MAGIC = b'RRPI'
+INDEX_VERSION = 2
+
+# Alphanumeric runs, keeping internal apostrophes ("don't", "o'clock")
+TERM_PATTERN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+def index_path(book_id: str) -> str:
+    """Location of the persisted positional index for a book"""
+    return data_path('search_index', f"{book_id}.idx")
+
+def terms_for_word(word: str) -> List[str]:
+    """Normalize a whitespace-delimited word into its distinct index terms.
+
+    Possessives index under the name ("Darcy's" -> "darcy"); hyphenated words
+    yield each part once ("ha-ha" -> "ha"), all at the word's offset.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(word.replace('’', "'").lower()):
+        if term.endswith("'s"):
+            term = term[:-2]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def query_terms(phrase: str) -> List[str]:
+    """Index terms of a phrase in order, split the same way as indexed words"""
+    return [term for word in phrase.split() for term in terms_for_word(word)]
+
+def encode_deltas(positions: Iterable[int]) -> bytes:
+    """Delta-encode ascending positions as unsigned LEB128 varints"""
+    out = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+def decode_deltas(data: bytes, max_position: Optional[int] = None) -> Iterator[int]:
+    """Decode delta varints, stopping once positions pass max_position"""
+    position = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        position += value
+        if max_position is not None and position > max_position:
+            return
+        yield position
+        value = 0
+        shift = 0
+
+class PositionalIndex:
+    """Per-book postings of word offsets, queryable up to a reading position"""
+
+    def __init__(self, book_id: str, total_words: int, postings: Dict[str, Tuple[int, bytes]]):
+        self.book_id = book_id
+        self.total_words = total_words
+        # term -> (occurrence count, delta-encoded positions)
+        self.postings = postings
+
+    def term_positions(self, term: str, max_position: Optional[int] = None) -> List[int]:
+        """Word offsets of a term, limited to positions <= max_position.
+
+        A hyphenated term is looked up like the phrase it is made of.
+        """
+        return self.phrase_positions(term, max_position)
+
+    def term_count(self, term: str, max_position: Optional[int] = None) -> int:
+        """Number of occurrences of a term up to max_position"""
+        terms = query_terms(term)
+        if max_position is None and len(terms) == 1:
+            return self.postings[terms[0]][0] if terms[0] in self.postings else 0
+        return len(self.term_positions(term, max_position))
+
+    def phrase_positions(self, phrase: str, max_position: Optional[int] = None) -> List[int]:
+        """Start offsets of a phrase whose last word lies at or before max_position.
+
+        Parts of a hyphenated word share its offset, so each term may follow the
+        previous one at the same offset or the next: "well-known" and "well
+        known" match either spelling in the text.
+        """
+        terms = query_terms(phrase)
+        if not terms:
+            return []
+        if any(term not in self.postings for term in terms):
+            return []
+        if len(terms) == 1:
+            return list(decode_deltas(self.postings[terms[0]][1], max_position))
+
+        # Anchor on the rarest term and extend each match outwards by set membership
+        anchor = min(range(len(terms)), key=lambda index: self.postings[terms[index]][0])
+        occurrences = {term: set(decode_deltas(self.postings[term][1], max_position)) for term in set(terms)}
+        # (offset of the first matched term, offset of the last) of every partial match
+        matches = [(position, position) for position in sorted(occurrences[terms[anchor]])]
+        for index in range(anchor + 1, len(terms)):
+            found = occurrences[terms[index]]
+            # A repeated term can't share an offset: each word indexes a term once
+            steps = (1,) if terms[index] == terms[index - 1] else (0, 1)
+            matches = list(dict.fromkeys(
+                (start, end + step) for start, end in matches for step in steps if end + step in found
+            ))
+        for index in range(anchor - 1, -1, -1):
+            found = occurrences[terms[index]]
+            steps = (1,) if terms[index] == terms[index + 1] else (0, 1)
+            matches = list(dict.fromkeys(
+                (start - step, end) for start, end in matches for step in steps if start - step in found
+            ))
+        return sorted(set(start for start, _ in matches))
+
+    def search(self, query: str, max_position: Optional[int] = None) -> List[int]:
+        """Look up a term or a phrase, never returning matches past max_position"""
+        return self.phrase_positions(query, max_position)
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Persist the index to disk in a compact binary form"""
+        path = path or index_path(self.book_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(struct.pack('<HII', INDEX_VERSION, self.total_words, len(self.postings)))
+            for term, (count, data) in self.postings.items():
+                encoded = term.encode('utf-8')
+                f.write(struct.pack('<HII', len(encoded), count, len(data)))
+                f.write(encoded)
+                f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, book_id: str, path: Optional[str] = None) -> Optional['PositionalIndex']:
+        """Load a persisted index, or None if the book has not been indexed"""
+        path = path or index_path(book_id)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if raw[:4] != INDEX_MAGIC:
+            raise ValueError(f"Invalid search index file: {path}")
+
+        version, total_words, term_count = struct.unpack_from('<HII', raw, 4)
+        if version != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version {version} in {path}; rebuild it with search_index.py")
+
+        view = memoryview(raw)
+        offset = 14
+        postings: Dict[str, Tuple[int, bytes]] = {}
+        for _ in range(term_count):
+            term_length, count, data_length = struct.unpack_from('<HII', raw, offset)
+            offset += 10
+            term = bytes(view[offset:offset + term_length]).decode('utf-8')
+            offset += term_length
+            postings[term] = (count, view[offset:offset + data_length])
+            offset += data_length
+        return cls(book_id, total_words, postings)
+
+class PositionalIndexBuilder:
+    """Accumulates word offsets for a book, in reading order"""
+
+    def __init__(self, book_id: str):
+        self.book_id = book_id
+        self.positions: Dict[str, array] = {}
+        self.total_words = 0
+
+    def add_words(self, words: List[str], start_position: int):
+        """Index words whose first word sits at start_position"""
+        self.add_terms([terms_for_word(word) for word in words], start_position)
+
+    def add_terms(self, word_terms: List[List[str]], start_position: int):
+        """Index already-normalized terms, one list per word, starting at start_position"""
+        positions = self.positions
+        for offset, terms in enumerate(word_terms, start_position):
+            for term in terms:
+                postings = positions.get(term)
+                if postings is None:
+                    postings = positions[term] = array('I')
+                postings.append(offset)
+        self.total_words = max(self.total_words, start_position + len(word_terms))
+
+    def add_text(self, text: str, start_position: int):
+        """Index a block of text whose first word sits at start_position"""
+        self.add_words(text.split(), start_position)
+
+    def build(self) -> PositionalIndex:
+        """Delta-encode the accumulated postings into a queryable index"""
+        postings = {
+            term: (len(positions), encode_deltas(positions))
+            for term, positions in self.positions.items()
+        }
+        return PositionalIndex(self.book_id, self.total_words, postings)
+
+class SearchIndexer:
+    """Builds positional indexes from the sections already stored in the database"""
+
+    def __init__(self):
+        # Initialize Prisma client
+        self.db = Prisma()
+        self.sections = SectionStore(self.db)
+
+    async def connect(self):
+        """Connect to the database"""
+        try:
+            await self.db.connect()
+            logger.info("Connected to database successfully")
+        except Exception as e:
+            logger.error(f"Error connecting to database: {str(e)}")
+            raise
+
+    async def disconnect(self):
+        """Disconnect from the database"""
+        if self.db:
+            await self.db.disconnect()
+            logger.info("Disconnected from database")
+
+    async def index_book(self, book_id: str) -> Optional[PositionalIndex]:
+        """Build and persist the positional index for one book"""
+        sections = await self.sections.find_many(
+            where={"bookId": book_id},
+            order={"startPosition": "asc"}
+        )
+        if not sections:
+            logger.warning(f"No sections found for book: {book_id}")
+            return None
+
+        builder = PositionalIndexBuilder(book_id)
+        for section in sections:
+            builder.add_text(section.content, section.startPosition)
+
+        index = builder.build()
+        path = index.save()
+        logger.info(f"Indexed book {book_id}: {len(index.postings)} terms, {index.total_words} words -> {path}")
+        return index
+
+    async def index_all_books(self):
+        """Build indexes for every book in the database"""
+        books = await self.db.book.find_many()
+        for book in books:
+            try:
+                await self.index_book(book.id)
+            except Exception as e:
+                logger.error(f"Error indexing book {book.id}: {str(e)}")
+
+async def main():
+    """Main function to build search indexes"""
+    indexer = SearchIndexer()
+
+    try:
+        await indexer.connect()
+        await indexer.index_all_books()
+    finally:
+        await indexer.disconnect()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+import os
+import sys
+import asyncio
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from section_storage import SectionStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.getenv('SECTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+class BookText:
+    """A book's sections flattened into one space-joined string of words.
+
+    Word i starts at character word_starts[i], so any word window is a single
+    string slice and word positions map directly to BookSection positions.
+    """
+
+    def __init__(self, book_id: str, words: List[str], total_words: int):
+        self.book_id = book_id
+        self.text = " ".join(words)
+        self.word_starts = array('I')
+        offset = 0
+        for word in words:
+            self.word_starts.append(offset)
+            offset += len(word) + 1
+        self.total_words = total_words
+
+    @property
+    def word_count(self) -> int:
+        return len(self.word_starts)
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate memory held by this entry"""
+        return sys.getsizeof(self.text) + self.word_starts.itemsize * len(self.word_starts)
+
+    def words_between(self, start: int, end: int) -> str:
+        """Words in [start, end) joined by single spaces"""
+        start = max(0, start)
+        end = min(self.word_count, end)
+        if start >= end:
+            return ""
+        if end == self.word_count:
+            return self.text[self.word_starts[start]:]
+        return self.text[self.word_starts[start]:self.word_starts[end] - 1]
+
+    def window(self, position: int, window_size: int) -> str:
+        """Words within window_size of position"""
+        return self.words_between(position - window_size, position + window_size)
+
+class SectionCache:
+    """Memory-bounded LRU of flattened book texts, loaded once per book"""
+
+    def __init__(self, store: SectionStore, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[str, BookText]' = OrderedDict()
+        self.current_bytes = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, book_id: str) -> Optional[BookText]:
+        """Return the cached text of a book, loading all its sections on a miss"""
+        entry = self.entries.get(book_id)
+        if entry is not None:
+            self.entries.move_to_end(book_id)
+            return entry
+
+        # Concurrent requests for the same book share a single fetch
+        lock = self._locks.setdefault(book_id, asyncio.Lock())
+        async with lock:
+            entry = self.entries.get(book_id)
+            if entry is None:
+                entry = await self._load(book_id)
+                if entry is not None:
+                    self._insert(entry)
+        self._locks.pop(book_id, None)
+        return entry
+
+    async def _load(self, book_id: str) -> Optional[BookText]:
+        sections = await self.store.find_many(
+            where={"bookId": book_id},
+            order={"startPosition": "asc"}
+        )
+        if not sections:
+            return None
+
+        words: List[str] = []
+        for section in sections:
+            if section.startPosition != len(words):
+                logger.warning(f"Section {section.id} of book {book_id} starts at {section.startPosition}, expected {len(words)}")
+            words.extend(section.content.split())
+
+        entry = BookText(book_id, words, sections[-1].endPosition)
+        logger.info(f"Cached {entry.word_count} words for book {book_id} from {len(sections)} sections")
+        return entry
+
+    def _insert(self, entry: BookText):
+        self.entries[entry.book_id] = entry
+        self.current_bytes += entry.size_bytes
+        # Evict least recently used books, but always keep the one just loaded
+        while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.size_bytes
+            logger.info(f"Evicted book {evicted.book_id} from section cache")
+
+    def invalidate(self, book_id: str):
+        """Drop a book, e.g. after its sections were rebuilt"""
+        entry = self.entries.pop(book_id, None)
+        if entry is not None:
+            self.current_bytes -= entry.size_bytes
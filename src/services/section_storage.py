@@ -0,0 +1,260 @@
+import os
+import sys
+import zlib
+import hashlib
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from prisma import Prisma
+from prisma.fields import Base64
+from config import data_path
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Storage modes: plain | zlib | zstd | blob
+STORAGE_MODES = ('plain', 'zlib', 'zstd', 'blob')
+DEFAULT_STORAGE_MODE = os.getenv('SECTION_STORAGE', 'plain')
+
+# zlib only uses the last 32KB of a preset dictionary
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+ZSTD_DICTIONARY_SIZE = 112 * 1024
+
+def content_hash(text: str) -> str:
+    """Content address of a section body"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def dictionary_path(dictionary_id: str) -> str:
+    """Location of a shared compression dictionary"""
+    return data_path('section_storage', 'dictionaries', f"{dictionary_id}.dict")
+
+def current_dictionary_id() -> Optional[str]:
+    """Id of the most recently trained dictionary, if any"""
+    configured = os.getenv('SECTION_STORAGE_DICTIONARY')
+    if configured:
+        return configured
+    pointer = data_path('section_storage', 'dictionaries', 'current')
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return f.read().strip() or None
+
+def blob_path(digest: str) -> str:
+    """Location of an external section blob addressed by its content hash"""
+    root = os.getenv('SECTION_BLOB_DIR')
+    if root:
+        path = os.path.join(root, digest[:2], digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    return data_path('section_storage', 'blobs', digest[:2], digest)
+
+def train_dictionary(samples: List[str], mode: str = 'zlib') -> str:
+    """Train a shared dictionary from sample section bodies and make it current"""
+    if mode == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd storage requires the 'zstandard' package")
+        trained = zstandard.train_dictionary(
+            ZSTD_DICTIONARY_SIZE,
+            [sample.encode('utf-8') for sample in samples]
+        )
+        dictionary = trained.as_bytes()
+    else:
+        # zlib has no trainer: seed it with the corpus' most frequent words,
+        # most frequent last since zlib favours the closest matches
+        counts = Counter(word for sample in samples for word in sample.split())
+        dictionary = b''
+        for word, _ in counts.most_common():
+            candidate = word.encode('utf-8') + b' '
+            if len(dictionary) + len(candidate) > ZLIB_DICTIONARY_SIZE:
+                break
+            dictionary = candidate + dictionary
+
+    dictionary_id = f"{mode}-{hashlib.sha256(dictionary).hexdigest()[:16]}"
+    with open(dictionary_path(dictionary_id), 'wb') as f:
+        f.write(dictionary)
+    with open(data_path('section_storage', 'dictionaries', 'current'), 'w') as f:
+        f.write(dictionary_id)
+    logger.info(f"Trained {mode} dictionary {dictionary_id} ({len(dictionary)} bytes) from {len(samples)} samples")
+    return dictionary_id
+
+class SectionCodec:
+    """Encodes section bodies for storage and decodes them back to text"""
+
+    def __init__(self, mode: Optional[str] = None, dictionary_id: Optional[str] = None):
+        self.mode = mode or DEFAULT_STORAGE_MODE
+        if self.mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown section storage mode: {self.mode}")
+        if self.mode == 'zstd' and zstandard is None:
+            raise ValueError("zstd storage requires the 'zstandard' package")
+
+        self.dictionary_id = dictionary_id or current_dictionary_id()
+        if self.dictionary_id and not self.dictionary_id.startswith(f"{self.mode}-"):
+            # A dictionary trained for another codec is of no use here
+            self.dictionary_id = None
+        self._dictionaries: Dict[str, bytes] = {}
+
+    def _dictionary(self, dictionary_id: str) -> bytes:
+        if dictionary_id not in self._dictionaries:
+            with open(dictionary_path(dictionary_id), 'rb') as f:
+                self._dictionaries[dictionary_id] = f.read()
+        return self._dictionaries[dictionary_id]
+
+    def storage_tag(self) -> str:
+        if self.mode in ('zlib', 'zstd') and self.dictionary_id:
+            return f"{self.mode}:{self.dictionary_id}"
+        return self.mode
+
+    def compress(self, data: bytes, storage: str) -> bytes:
+        """Compress raw bytes according to a storage tag"""
+        mode, _, dictionary_id = storage.partition(':')
+        if mode == 'zstd':
+            dictionary = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id)) if dictionary_id else None
+            return zstandard.ZstdCompressor(level=19, dict_data=dictionary).compress(data)
+        if dictionary_id:
+            compressor = zlib.compressobj(9, zdict=self._dictionary(dictionary_id))
+        else:
+            compressor = zlib.compressobj(9)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, storage: str) -> bytes:
+        """Decompress raw bytes according to a storage tag"""
+        mode, _, dictionary_id = storage.partition(':')
+        if mode == 'zstd':
+            if zstandard is None:
+                raise ValueError("Reading zstd sections requires the 'zstandard' package")
+            dictionary = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id)) if dictionary_id else None
+            return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+        if dictionary_id:
+            decompressor = zlib.decompressobj(zdict=self._dictionary(dictionary_id))
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def encode(self, text: str) -> Dict[str, Any]:
+        """Return the BookSection fields that store the given body"""
+        if self.mode == 'plain':
+            return {'content': text, 'storage': 'plain'}
+
+        raw = text.encode('utf-8')
+        if self.mode == 'blob':
+            digest = content_hash(text)
+            path = blob_path(digest)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(zlib.compress(raw, 9))
+                os.replace(tmp_path, path)
+            return {'content': '', 'storage': 'blob', 'contentHash': digest}
+
+        storage = self.storage_tag()
+        return {
+            'content': '',
+            'storage': storage,
+            'compressedContent': Base64.encode(self.compress(raw, storage))
+        }
+
+    def decode(self, section: Any) -> str:
+        """Return the plain text body of a stored section"""
+        storage = getattr(section, 'storage', None) or 'plain'
+        if storage == 'plain':
+            return section.content
+        if storage == 'blob':
+            with open(blob_path(section.contentHash), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        return self.decompress(section.compressedContent.decode(), storage).decode('utf-8')
+
+class LazySection:
+    """A BookSection row whose body is only decoded when first read"""
+
+    def __init__(self, section: Any, codec: SectionCodec):
+        self._section = section
+        self._codec = codec
+        self._content: Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = self._codec.decode(self._section)
+        return self._content
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._section, name)
+
+class SectionStore:
+    """Transparent accessor over BookSection rows regardless of storage mode"""
+
+    def __init__(self, db: Prisma, codec: Optional[SectionCodec] = None):
+        self.db = db
+        self.codec = codec or SectionCodec()
+
+    def fields_for(self, text: str) -> Dict[str, Any]:
+        """BookSection fields for a new section body in the configured mode"""
+        return self.codec.encode(text)
+
+    async def find_many(self, **kwargs) -> List[LazySection]:
+        """Query sections; bodies are decompressed only when accessed"""
+        sections = await self.db.booksection.find_many(**kwargs)
+        return [LazySection(section, self.codec) for section in sections]
+
+    async def convert_book(self, book_id: str) -> int:
+        """Rewrite a book's sections in the configured storage mode"""
+        sections = await self.find_many(where={"bookId": book_id})
+        target = self.codec.storage_tag()
+        converted = 0
+        for section in sections:
+            if (section.storage or 'plain') == target:
+                continue
+            data = {
+                'content': '',
+                'compressedContent': None,
+                'contentHash': None,
+                **self.codec.encode(section.content)
+            }
+            await self.db.booksection.update(where={"id": section.id}, data=data)
+            converted += 1
+        return converted
+
+async def sample_sections(db: Prisma, limit: int = 2000) -> List[str]:
+    """Collect section bodies to train a dictionary on"""
+    store = SectionStore(db, SectionCodec('plain'))
+    sections = await store.find_many(take=limit)
+    return [section.content for section in sections if section.content]
+
+async def main():
+    """Train a corpus dictionary (train) or convert stored sections (convert)"""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'convert'
+    db = Prisma()
+
+    try:
+        await db.connect()
+        if command == 'train':
+            mode = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORAGE_MODE
+            samples = await sample_sections(db)
+            train_dictionary(samples, 'zstd' if mode == 'zstd' else 'zlib')
+        elif command == 'convert':
+            store = SectionStore(db)
+            books = await db.book.find_many()
+            for book in books:
+                converted = await store.convert_book(book.id)
+                logger.info(f"Converted {converted} sections of book {book.id} to {store.codec.mode}")
+        else:
+            logger.error(f"Unknown command: {command}")
+    finally:
+        await db.disconnect()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
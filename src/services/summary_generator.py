@@ -1,12 +1,18 @@
 import os
 import json
+import asyncio
 import logging
-from typing import List, Dict, Optional
+import argparse
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import aiohttp
 from dotenv import load_dotenv
 from prisma import Prisma
 import time
+from section_storage import SectionStore
+from chunk_packing import estimate_tokens, pack_chunks
+from section_cache import SectionCache
+from book_leases import LeaseManager, add_run_arguments, in_shard, leases_from_args
 
 # Configure logging
 logging.basicConfig(
@@ -18,20 +24,56 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Summarization backends and the input context each model accepts, in tokens
+BACKENDS = {
+    "distilbart-cnn-6-6": {
+        "model_url": "https://api-inference.huggingface.co/models/sshleifer/distilbart-cnn-6-6",
+        "context_tokens": 1024
+    },
+    "bart-large-cnn": {
+        "model_url": "https://api-inference.huggingface.co/models/facebook/bart-large-cnn",
+        "context_tokens": 1024
+    },
+    "led-base-16384": {
+        "model_url": "https://api-inference.huggingface.co/models/allenai/led-base-16384",
+        "context_tokens": 16384
+    }
+}
+
+# Headroom for special tokens and token-estimate error
+CONTEXT_SAFETY_MARGIN = 0.9
+
+# Summaries are generated at these percentages of each book
+CHECKPOINT_PERCENTAGES = range(10, 101, 10)
+
+# Guards against runaway recursion when partial summaries don't shrink
+MAX_REDUCE_DEPTH = 3
+
 class SummaryGenerator:
-    def __init__(self):
+    def __init__(self, db: Optional[Prisma] = None):
         self.api_key = os.getenv('HUGGING_FACE_API_KEY')
         if not self.api_key:
             raise ValueError("HUGGING_FACE_API_KEY not found in environment variables")
         
-        self.model_url = "https://api-inference.huggingface.co/models/sshleifer/distilbart-cnn-6-6"
+        backend_name = os.getenv('SUMMARY_BACKEND', 'distilbart-cnn-6-6')
+        if backend_name not in BACKENDS:
+            raise ValueError(f"Unknown SUMMARY_BACKEND: {backend_name}")
+        backend = BACKENDS[backend_name]
+        
+        self.model_url = backend["model_url"]
+        self.context_tokens = int(os.getenv('SUMMARY_CONTEXT_TOKENS', backend["context_tokens"]))
+        self.input_token_budget = int(self.context_tokens * CONTEXT_SAFETY_MARGIN)
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
         
-        # Initialize Prisma client
-        self.db = Prisma()
+        # Initialize Prisma client (a long-lived worker passes in a shared one)
+        self.db = db or Prisma()
+        # Reused across requests so connections to the inference API stay warm
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self.sections = SectionStore(self.db)
+        self.section_cache = SectionCache(self.sections)
         
     async def connect(self):
         """Connect to the database"""
@@ -44,10 +86,19 @@ class SummaryGenerator:
     
     async def disconnect(self):
         """Disconnect from the database"""
-        if self.db:
+        if self.http_session:
+            await self.http_session.close()
+            self.http_session = None
+        if self.db.is_connected():
             await self.db.disconnect()
             logger.info("Disconnected from database")
     
+    def get_http_session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session for inference requests"""
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = aiohttp.ClientSession()
+        return self.http_session
+    
     def count_words(self, text: str) -> int:
         """Count words in a text string"""
         return len(text.split())
@@ -55,36 +106,12 @@ class SummaryGenerator:
     async def get_text_at_position(self, book_id: str, position: int, window_size: int = 1000) -> str:
         """Get text content around a specific position using a sliding window approach."""
         try:
-            # Get sections that contain the target position
-            sections = await self.db.booksection.find_many(
-                where={
-                    "bookId": book_id,
-                    "startPosition": {
-                        "lte": position + window_size
-                    },
-                    "endPosition": {
-                        "gte": position - window_size
-                    }
-                },
-                order={
-                    "startPosition": "asc"
-                }
-            )
-            
-            if not sections:
+            # All windows of a book are served from one cached fetch of its sections
+            book_text = await self.section_cache.get(book_id)
+            if not book_text:
                 return ""
             
-            # Combine sections and extract the relevant window
-            text = ""
-            for section in sections:
-                text += section.content + "\n"
-            
-            # Split into words and get the window around the target position
-            words = text.split()
-            start_idx = max(0, position - window_size)
-            end_idx = min(len(words), position + window_size)
-            
-            return " ".join(words[start_idx:end_idx])
+            return book_text.window(position, window_size)
             
         except Exception as e:
             logging.error(f"Error getting text at position: {str(e)}")
@@ -110,44 +137,44 @@ class SummaryGenerator:
             max_retries = 3
             retry_delay = 2  # seconds
             
-            async with aiohttp.ClientSession() as session:
-                for attempt in range(max_retries):
-                    try:
-                        async with session.post(
-                            self.model_url,
-                            headers=self.headers,
-                            json=payload,
-                            timeout=30
-                        ) as response:
-                            if response.status == 200:
-                                result = await response.json()
-                                if isinstance(result, list) and len(result) > 0:
-                                    summary = result[0].get("summary_text", "").strip()
-                                    # Ensure the summary doesn't exceed max_words
-                                    words = summary.split()
-                                    if len(words) > max_words:
-                                        summary = " ".join(words[:max_words]) + "..."
-                                    return summary
-                                else:
-                                    logger.error("Unexpected API response format")
-                                    return None
-                            elif response.status == 503:
-                                # Model is loading, wait and retry
-                                if attempt < max_retries - 1:
-                                    logger.warning(f"Model is loading, retrying in {retry_delay} seconds...")
-                                    await asyncio.sleep(retry_delay)
-                                    continue
+            session = self.get_http_session()
+            for attempt in range(max_retries):
+                try:
+                    async with session.post(
+                        self.model_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=30
+                    ) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            if isinstance(result, list) and len(result) > 0:
+                                summary = result[0].get("summary_text", "").strip()
+                                # Ensure the summary doesn't exceed max_words
+                                words = summary.split()
+                                if len(words) > max_words:
+                                    summary = " ".join(words[:max_words]) + "..."
+                                return summary
                             else:
-                                error_text = await response.text()
-                                logger.error(f"API request failed with status code {response.status}: {error_text}")
+                                logger.error("Unexpected API response format")
                                 return None
-                    except Exception as e:
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Request failed, retrying in {retry_delay} seconds...")
-                            await asyncio.sleep(retry_delay)
-                            continue
-                        logger.error(f"Error generating summary: {str(e)}")
-                        return None
+                        elif response.status == 503:
+                            # Model is loading, wait and retry
+                            if attempt < max_retries - 1:
+                                logger.warning(f"Model is loading, retrying in {retry_delay} seconds...")
+                                await asyncio.sleep(retry_delay)
+                                continue
+                        else:
+                            error_text = await response.text()
+                            logger.error(f"API request failed with status code {response.status}: {error_text}")
+                            return None
+                except Exception as e:
+                    if attempt < max_retries - 1:
+                        logger.warning(f"Request failed, retrying in {retry_delay} seconds...")
+                        await asyncio.sleep(retry_delay)
+                        continue
+                    logger.error(f"Error generating summary: {str(e)}")
+                    return None
             
             return None
 
@@ -155,27 +182,91 @@ class SummaryGenerator:
             logger.error(f"Error generating summary: {str(e)}")
             return None
     
-    async def process_book(self, book_id: str):
-        """Process a book and generate summaries at percentage intervals."""
+    async def summarize_window(self, content: str, book_id: str, max_words: int = 250, depth: int = 0) -> str:
+        """Summarize text of any length by packing it into model-sized chunks.
+        
+        Each chunk is summarized on its own (map), then the partial summaries
+        are summarized together (reduce), recursing while they still exceed
+        the model context.
+        """
+        chunks = pack_chunks(content, self.input_token_budget)
+        if not chunks:
+            return None
+        if len(chunks) == 1:
+            return await self.generate_summary(chunks[0], book_id, max_words)
+        
+        logger.info(f"Summarizing {len(chunks)} chunks for book {book_id} (depth {depth})")
+        partial_words = max(60, max_words // 2)
+        partials = []
+        for chunk in chunks:
+            partial = await self.generate_summary(chunk, book_id, partial_words)
+            if partial:
+                partials.append(partial)
+        
+        if not partials:
+            return None
+        
+        combined = " ".join(partials)
+        if len(partials) == 1:
+            return partials[0]
+        if estimate_tokens(combined) > self.input_token_budget and depth + 1 >= MAX_REDUCE_DEPTH:
+            logger.warning(f"Partial summaries still exceed the context for book {book_id}; truncating")
+            combined = pack_chunks(combined, self.input_token_budget)[0]
+        return await self.summarize_window(combined, book_id, max_words, depth + 1)
+    
+    def checkpoint_positions(self, total_words: int) -> List[int]:
+        """Word positions at which summaries are generated for a book"""
+        return [int(total_words * percentage / 100) for percentage in CHECKPOINT_PERCENTAGES]
+    
+    async def generate_checkpoint(self, book_id: str, target_position: int) -> bool:
+        """Generate and store the summary for one checkpoint of a book"""
+        try:
+            # Get content around the target position
+            content = await self.get_text_at_position(book_id, target_position)
+            if not content:
+                logger.warning(f"No content found at position {target_position} for book {book_id}")
+                return False
+            
+            # Generate summary for this window, packed to the model context
+            summary = await self.summarize_window(content, book_id)
+            if not summary:
+                return False
+            
+            await self.db.summary.create({
+                "bookId": book_id,
+                "position": target_position,
+                "content": summary
+            })
+            logger.info(f"Created summary at position {target_position} for book {book_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error generating summary at position {target_position}: {str(e)}")
+            return False
+    
+    async def process_book(self, book_id: str, raise_errors: bool = False):
+        """Process a book and generate summaries at percentage intervals.
+        
+        With raise_errors, a missing book, missing sections or any failed
+        checkpoint raises instead of only being logged, so callers can retry.
+        """
         try:
             # Get the book and its total word count
             book = await self.db.book.find_unique(where={"id": book_id})
             if not book:
-                logger.error(f"Book not found: {book_id}")
-                return
+                raise ValueError(f"Book not found: {book_id}")
             
-            # Get the last section to determine total word count
-            last_section = await self.db.booksection.find_first(
-                where={"bookId": book_id},
-                order={"endPosition": "desc"}
-            )
-            if not last_section:
-                logger.error(f"No sections found for book: {book_id}")
-                return
+            # Load the book's sections once; every checkpoint window is cut from them
+            book_text = await self.section_cache.get(book_id)
+            if not book_text:
+                raise ValueError(f"No sections found for book: {book_id}")
             
-            total_words = last_section.endPosition
+            total_words = book_text.total_words
             
-            # Create initial summary at position 0
+            # Replace summaries from an earlier run of this book
+            await self.db.summary.delete_many(where={"bookId": book_id})
+            
+            # Create initial summary at position 0; it summarizes no text, so it is
+            # best effort and never fails the book
             initial_summary = await self.generate_summary("", book_id)
             if initial_summary:
                 await self.db.summary.create({
@@ -186,63 +277,60 @@ class SummaryGenerator:
                 logger.info(f"Created initial summary for book {book_id}")
             
             # Generate summaries at 10% intervals
-            for percentage in range(10, 101, 10):
-                target_position = int(total_words * percentage / 100)
-                try:
-                    # Get content around the target position
-                    content = await self.get_text_at_position(book_id, target_position)
-                    if not content:
-                        logger.warning(f"No content found at {percentage}% for book {book_id}")
-                        continue
-                    
-                    # Generate summary for this chunk
-                    summary = await self.generate_summary(content, book_id)
-                    if summary:
-                        await self.db.summary.create({
-                            "bookId": book_id,
-                            "position": target_position,
-                            "content": summary
-                        })
-                        logger.info(f"Created summary at {percentage}% for book {book_id}")
-                except Exception as e:
-                    logger.error(f"Error generating summary at {percentage}%: {str(e)}")
-                    continue
+            failed = [
+                target_position
+                for target_position in self.checkpoint_positions(total_words)
+                if not await self.generate_checkpoint(book_id, target_position)
+            ]
+            if failed:
+                raise RuntimeError(f"Failed to summarize book {book_id} at positions {failed}")
             
             logger.info(f"Completed processing book {book_id}")
         except Exception as e:
             logger.error(f"Error processing book {book_id}: {str(e)}")
+            if raise_errors:
+                raise
     
-    async def process_all_books(self):
-        """Process all books in the database."""
+    async def process_all_books(self, shard: Optional[Tuple[int, int]] = None, leases: Optional[LeaseManager] = None):
+        """Process all books in the database, or this worker's share of them."""
         try:
-            # Clear existing summaries
-            await self.db.summary.delete_many()
-            logger.info("Cleared existing summaries")
-            
             # Get all books
             books = await self.db.book.find_many()
             
             # Process each book
             for book in books:
-                logger.info(f"Processing book: {book.id}")
-                await self.process_book(book.id)
+                if not in_shard(book.id, shard):
+                    continue
+                
+                if leases is None:
+                    logger.info(f"Processing book: {book.id}")
+                    await self.process_book(book.id)
+                    continue
+                
+                # A failed book is released for a retry rather than completed for the run
+                try:
+                    ran = await leases.run(book.id, lambda: self.process_book(book.id, raise_errors=True))
+                    if not ran:
+                        logger.info(f"Skipping book {book.id}: claimed by another worker or already done")
+                except Exception as e:
+                    logger.error(f"Released book {book.id} after an error: {str(e)}")
                 
         except Exception as e:
             logger.error(f"Error processing books: {str(e)}")
-        finally:
-            await self.db.disconnect()
-            logger.info("Disconnected from database")
 
 async def main():
     """Main function to run the summary generator"""
+    parser = argparse.ArgumentParser(description="Generate checkpoint summaries")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    
     generator = SummaryGenerator()
     
     try:
         await generator.connect()
-        await generator.process_all_books()
+        await generator.process_all_books(args.shard, leases_from_args(generator.db, 'summarize_book', args))
     finally:
         await generator.disconnect()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,184 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from summary_generator import SummaryGenerator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Priority tiers, lowest served first
+TIER_ACTIVE_READER = 0
+TIER_NEW_BOOK = 1
+TIER_BACKFILL = 2
+
+# Readers who moved within this window count as active
+ACTIVE_READER_HOURS = int(os.getenv('SCHEDULER_ACTIVE_READER_HOURS', 72))
+# Books created within this window get their opening checkpoints first
+NEW_BOOK_HOURS = int(os.getenv('SCHEDULER_NEW_BOOK_HOURS', 48))
+# How many checkpoints past a reader's position to prepare ahead of them
+LOOKAHEAD_CHECKPOINTS = int(os.getenv('SCHEDULER_LOOKAHEAD_CHECKPOINTS', 2))
+# Opening checkpoints prioritised for new uploads
+OPENING_CHECKPOINTS = 2
+
+Job = Tuple[tuple, str, int]
+
+class SummaryScheduler:
+    """Orders checkpoint generation by what readers are about to need.
+
+    Checkpoints at and just ahead of active readers' positions come first,
+    weighted by how many readers are approaching them; new uploads get their
+    opening checkpoints next; the rest of the catalog is backfilled breadth
+    first, earliest checkpoints of every book before later ones.
+
+    Reader demand comes from ReadingState rows. The progress route does not
+    write them yet (it only acknowledges positions), so until it does the
+    active-reader tier stays empty and scheduling is new books then backfill.
+    """
+
+    def __init__(self, generator: SummaryGenerator, refresh_seconds: int = 60):
+        self.generator = generator
+        self.db = generator.db
+        self.refresh_seconds = refresh_seconds
+        # Checkpoints that failed this cycle are not retried until the queue drains
+        self.failed: Set[Tuple[str, int]] = set()
+        # Book lengths seen by the last queue build, to notice re-sectioned books
+        self.book_lengths: Dict[str, int] = {}
+
+    async def load_book_lengths(self) -> Dict[str, int]:
+        """Total word count of every sectioned book"""
+        rows = await self.db.query_raw(
+            'SELECT "bookId", MAX("endPosition") AS "totalWords" FROM "BookSection" GROUP BY "bookId"'
+        )
+        return {row['bookId']: int(row['totalWords']) for row in rows if row['totalWords']}
+
+    async def load_existing_checkpoints(self) -> Set[Tuple[str, int]]:
+        """(bookId, position) pairs that already have a summary"""
+        rows = await self.db.query_raw('SELECT "bookId", "position" FROM "Summary"')
+        return {(row['bookId'], int(row['position'])) for row in rows}
+
+    async def load_reader_positions(self) -> Dict[str, List[int]]:
+        """Positions of recently active readers, grouped by book"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=ACTIVE_READER_HOURS)
+        states = await self.db.readingstate.find_many(where={"updatedAt": {"gte": cutoff}})
+        positions: Dict[str, List[int]] = defaultdict(list)
+        for state in states:
+            positions[state.bookId].append(state.position)
+        return positions
+
+    async def build_queue(self) -> List[Job]:
+        """Compute the prioritised list of missing checkpoints"""
+        lengths = await self.load_book_lengths()
+        # A book whose length changed was re-sectioned: its cached text is stale
+        for book_id, total_words in self.book_lengths.items():
+            if lengths.get(book_id) != total_words:
+                self.generator.section_cache.invalidate(book_id)
+        self.book_lengths = lengths
+        existing = await self.load_existing_checkpoints()
+        readers = await self.load_reader_positions()
+        new_cutoff = datetime.now(timezone.utc) - timedelta(hours=NEW_BOOK_HOURS)
+        new_books = {
+            book.id: book.createdAt
+            for book in await self.db.book.find_many(where={"createdAt": {"gte": new_cutoff}})
+        }
+
+        priorities: Dict[Tuple[str, int], tuple] = {}
+
+        def offer(book_id: str, position: int, priority: tuple):
+            key = (book_id, position)
+            if key in existing or key in self.failed:
+                return
+            if key not in priorities or priority < priorities[key]:
+                priorities[key] = priority
+
+        for book_id, total_words in lengths.items():
+            checkpoints = self.generator.checkpoint_positions(total_words)
+
+            # Readers approaching each checkpoint, by how many checkpoints away it is
+            demand: Dict[int, List[int]] = defaultdict(list)
+            for reader_position in readers.get(book_id, []):
+                # The summary shown is the last checkpoint <= position, then the ones ahead
+                current = max([i for i, c in enumerate(checkpoints) if c <= reader_position], default=0)
+                for rank, index in enumerate(range(current, min(current + 1 + LOOKAHEAD_CHECKPOINTS, len(checkpoints)))):
+                    demand[index].append(rank)
+            for index, ranks in demand.items():
+                offer(book_id, checkpoints[index], (TIER_ACTIVE_READER, min(ranks), -len(ranks), index))
+
+            if book_id in new_books:
+                age = (datetime.now(timezone.utc) - new_books[book_id]).total_seconds()
+                for index in range(min(OPENING_CHECKPOINTS, len(checkpoints))):
+                    offer(book_id, checkpoints[index], (TIER_NEW_BOOK, index, age))
+
+            for index, position in enumerate(checkpoints):
+                offer(book_id, position, (TIER_BACKFILL, index, 0))
+
+        queue = [(priority, book_id, position) for (book_id, position), priority in priorities.items()]
+        heapq.heapify(queue)
+        tiers = defaultdict(int)
+        for priority, _, _ in queue:
+            tiers[priority[0]] += 1
+        logger.info(
+            f"Scheduled {len(queue)} checkpoints: {tiers[TIER_ACTIVE_READER]} for active readers, "
+            f"{tiers[TIER_NEW_BOOK]} for new books, {tiers[TIER_BACKFILL]} backfill"
+        )
+        return queue
+
+    async def run(self, follow: bool = False, max_jobs: Optional[int] = None, idle_seconds: int = 30):
+        """Generate checkpoints in priority order, re-ranking as readers move"""
+        completed = 0
+        while True:
+            queue = await self.build_queue()
+            if not queue:
+                if not follow:
+                    break
+                self.failed.clear()
+                await asyncio.sleep(idle_seconds)
+                continue
+
+            refresh_at = time.monotonic() + self.refresh_seconds
+            while queue and time.monotonic() < refresh_at:
+                _, book_id, position = heapq.heappop(queue)
+                if not await self.generator.generate_checkpoint(book_id, position):
+                    self.failed.add((book_id, position))
+                completed += 1
+                if max_jobs is not None and completed >= max_jobs:
+                    logger.info(f"Scheduler stopped after {completed} checkpoints")
+                    return
+
+            if not queue and not follow:
+                break
+
+        logger.info(f"Scheduler finished after {completed} checkpoints")
+
+async def main():
+    """Main function to run the summary scheduler"""
+    parser = argparse.ArgumentParser(description="Generate summaries in reader-demand order")
+    parser.add_argument('--follow', action='store_true', help="keep running and pick up new demand")
+    parser.add_argument('--max-jobs', type=int, default=None, help="stop after this many checkpoints")
+    parser.add_argument('--refresh-seconds', type=int, default=60, help="how often to re-rank the queue")
+    args = parser.parse_args()
+
+    generator = SummaryGenerator()
+    scheduler = SummaryScheduler(generator, refresh_seconds=args.refresh_seconds)
+
+    try:
+        await generator.connect()
+        await scheduler.run(follow=args.follow, max_jobs=args.max_jobs)
+    finally:
+        await generator.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
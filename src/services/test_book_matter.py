@@ -0,0 +1,33 @@
+from book_matter import MatterDetector
+
+STANZA = (
+    "Higher still and higher\n"
+    "From the earth thou springest\n"
+    "Like a cloud of fire;\n"
+    "The blue deep thou wingest,\n"
+    "And singing still dost soar, and soaring ever singest."
+)
+
+def paragraphs(text):
+    return [(paragraph, len(paragraph.split())) for paragraph in text.split('\n\n')]
+
+def excluded_words(text, kind):
+    parsed = paragraphs(text)
+    ranges = MatterDetector().detect([('text', parsed)])
+    return sum(
+        count
+        for exclusion in ranges if exclusion['kind'] == kind
+        for _, count in parsed[exclusion['from']:exclusion['to']]
+    )
+
+def test_contents_block_stops_before_verse():
+    contents = "CONTENTS\n\nI. To a Skylark .... 3\nII. Ode to the West Wind .... 9\nIII. Ozymandias .... 14"
+    poem = "I.\nTO A SKYLARK\n\n" + "\n\n".join([STANZA] * 40)
+    text = contents + "\n\n" + poem
+    assert excluded_words(text, 'contents') == len(contents.split())
+
+def test_listed_entries_continue_the_run():
+    contents = "CONTENTS\n\nCHAPTER I. Down the Rabbit-Hole\n\nCHAPTER II. The Pool of Tears\n\nCHAPTER III. A Caucus-Race"
+    prose = " ".join(["word"] * 60)
+    text = contents + "\n\n" + "\n\n".join([prose] * 40)
+    assert excluded_words(text, 'contents') == len(contents.split())
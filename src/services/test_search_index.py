@@ -0,0 +1,23 @@
+from search_index import PositionalIndexBuilder
+
+def build(text):
+    builder = PositionalIndexBuilder('book')
+    builder.add_text(text, 0)
+    return builder.build()
+
+def test_hyphenated_and_spaced_phrases_match_each_other():
+    index = build("It is a well-known truth. A well known fact.")
+    assert index.search("well-known") == [3, 6]
+    assert index.search("well known") == [3, 6]
+    assert index.search("well-known truth") == [3]
+
+def test_single_word_lookups_agree_with_search():
+    index = build("It is a well-known truth. A well known fact.")
+    assert index.term_positions("well-known") == index.search("well-known")
+    assert index.term_count("well-known") == 2
+    assert index.term_count("well-known", max_position=6) == 1
+
+def test_possessives_index_under_the_name():
+    index = build("Darcy's pride offended Mr. Darcy")
+    assert index.term_positions("darcy") == [0, 4]
+    assert index.term_count("Darcy's") == 2
@@ -1,5 +1,4 @@
 import os
-import requests
 import json
 from dotenv import load_dotenv
 import cloudinary
@@ -8,6 +7,8 @@ import tempfile
 from ebooklib import epub
 from PIL import Image
 from io import BytesIO
+from http_cache import HttpCache
+from book_matter import strip_boilerplate
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +20,9 @@ cloudinary.config(
     api_secret=os.getenv('CLOUDINARY_API_SECRET')
 )
 
+# Shared on-disk cache so re-runs skip books and covers already fetched
+http_cache = HttpCache()
+
 # Popular books from Project Gutenberg
 BOOKS = [
     {"id": 1342, "title": "Pride and Prejudice", "author": "Jane Austen"},
@@ -33,19 +37,26 @@ BOOKS = [
     {"id": 174, "title": "The Picture of Dorian Gray", "author": "Oscar Wilde"}
 ]
 
+def gutenberg_text_urls(book_id):
+    """Candidate plain-text URLs for a Gutenberg book, last known good first."""
+    urls = [
+        f"https://www.gutenberg.org/files/{book_id}/{book_id}-0.txt",
+        f"https://www.gutenberg.org/cache/epub/{book_id}/pg{book_id}.txt"
+    ]
+    known = http_cache.recall(f"gutenberg:{book_id}")
+    if known in urls:
+        urls.remove(known)
+        urls.insert(0, known)
+    return urls
+
 def get_gutenberg_text(book_id):
     """Get book text from Project Gutenberg."""
-    url = f"https://www.gutenberg.org/files/{book_id}/{book_id}-0.txt"
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.text
-        
-        # Try alternative URL format
-        url = f"https://www.gutenberg.org/cache/epub/{book_id}/pg{book_id}.txt"
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.text
+        for url in gutenberg_text_urls(book_id):
+            response = http_cache.get(url)
+            if response.status_code == 200:
+                http_cache.remember(f"gutenberg:{book_id}", url)
+                return response.text
         
         return None
     except Exception as e:
@@ -88,13 +99,17 @@ def get_cover_image(title, author):
     """Get a cover image using the OpenLibrary API."""
     query = f"{title} {author}".replace(" ", "+")
     url = f"https://openlibrary.org/search.json?q={query}"
-    response = requests.get(url)
+    response = http_cache.get(url)
+    if response.status_code != 200:
+        return None
     data = response.json()
     
     if data["docs"] and "cover_i" in data["docs"][0]:
         cover_id = data["docs"][0]["cover_i"]
         cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg"
-        response = requests.get(cover_url)
+        response = http_cache.get(cover_url)
+        if response.status_code != 200:
+            return None
         return BytesIO(response.content)
     return None
 
@@ -109,6 +124,12 @@ def upload_book(book):
             print(f"❌ Could not fetch text for {book['title']}")
             return None
         
+        # Drop the Gutenberg license header/footer; contents and notes are only
+        # excluded at processing time, where the location map records them
+        text, removed = strip_boilerplate(text)
+        if removed:
+            print(f"✂️ Removed {sum(part['words'] for part in removed)} words of license text")
+        
         # Get and upload cover image
         cover_image = get_cover_image(book['title'], book['author'])
         if cover_image:
@@ -160,6 +181,16 @@ def upload_book(book):
         print(f"❌ Error processing {book['title']}: {str(e)}")
         return None
 
+def append_results(results, path='uploaded_books.json'):
+    """Add upload results to the JSON file read by the importers."""
+    existing = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            existing = json.load(f)
+    
+    with open(path, 'w') as f:
+        json.dump(existing + results, f, indent=2)
+
 def main():
     print("Starting book upload process...")
     results = []
@@ -0,0 +1,255 @@
+import os
+import time
+import socket
+import signal
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from aiohttp import web
+from dotenv import load_dotenv
+from prisma import Prisma
+from process_books import BookProcessor
+from summary_generator import SummaryGenerator
+from book_bundle import BundleExporter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 1.0))
+HEALTH_PORT = int(os.getenv('WORKER_HEALTH_PORT', 8081))
+MAX_ATTEMPTS = int(os.getenv('WORKER_MAX_ATTEMPTS', 3))
+# Running jobs whose worker stopped updating them for this long are taken over
+STALE_JOB_MINUTES = int(os.getenv('WORKER_STALE_JOB_MINUTES', 30))
+# A running job's lock is refreshed this often, well inside the stale window
+HEARTBEAT_SECONDS = STALE_JOB_MINUTES * 60 / 3
+
+# Job types
+PROCESS_BOOK = 'process_book'
+SUMMARIZE_BOOK = 'summarize_book'
+
+# Claims the oldest runnable job; SKIP LOCKED lets several workers poll the same table
+CLAIM_JOB_SQL = """
+UPDATE "Job"
+SET "status" = 'running',
+    "lockedBy" = $1,
+    "lockedAt" = NOW() AT TIME ZONE 'UTC',
+    "attempts" = "attempts" + 1,
+    "updatedAt" = NOW() AT TIME ZONE 'UTC'
+WHERE "id" = (
+    SELECT "id" FROM "Job"
+    WHERE ("status" = 'pending' AND "runAfter" <= NOW() AT TIME ZONE 'UTC')
+       OR ("status" = 'running' AND "lockedAt" < NOW() AT TIME ZONE 'UTC' - make_interval(mins => $2))
+    ORDER BY "createdAt"
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING "id", "type", "bookId", "attempts"
+"""
+
+HEARTBEAT_SQL = """
+UPDATE "Job"
+SET "lockedAt" = NOW() AT TIME ZONE 'UTC',
+    "updatedAt" = NOW() AT TIME ZONE 'UTC'
+WHERE "id" = $1 AND "lockedBy" = $2 AND "status" = 'running'
+"""
+
+async def enqueue_job(db: Prisma, job_type: str, book_id: Optional[str] = None):
+    """Add a job for the worker daemon"""
+    return await db.job.create({"type": job_type, "bookId": book_id})
+
+class Worker:
+    """Long-lived daemon that keeps the services warm and runs queued jobs"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        # One Prisma client, HTTP pools and caches shared by every job
+        self.db = Prisma()
+        self.processor = BookProcessor(db=self.db)
+        self.generator = SummaryGenerator(db=self.db)
+        self.exporter = BundleExporter(db=self.db)
+        self.stopping = asyncio.Event()
+        self.current_job: Optional[Dict[str, Any]] = None
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.last_poll: Optional[float] = None
+        self.started_at = time.time()
+
+    async def connect(self):
+        """Connect to the database"""
+        try:
+            await self.db.connect()
+            logger.info("Connected to database successfully")
+        except Exception as e:
+            logger.error(f"Error connecting to database: {str(e)}")
+            raise
+
+    async def disconnect(self):
+        """Release pools, the process pool and the database connection"""
+        await self.generator.disconnect()
+        await self.processor.disconnect()
+
+    async def claim_job(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the next runnable job, if any"""
+        rows = await self.db.query_raw(CLAIM_JOB_SQL, self.worker_id, STALE_JOB_MINUTES)
+        return rows[0] if rows else None
+
+    async def run_job(self, job: Dict[str, Any]):
+        """Dispatch a job to the service that handles it"""
+        book_id = job['bookId']
+        # Jobs raise on every failure, so retries and backoff apply and no follow-up is queued
+        if job['type'] == PROCESS_BOOK:
+            await self.processor.process_book(book_id, raise_errors=True)
+            # Sections changed: drop any cached copy and summarize the new text
+            self.generator.section_cache.invalidate(book_id)
+            await enqueue_job(self.db, SUMMARIZE_BOOK, book_id)
+        elif job['type'] == SUMMARIZE_BOOK:
+            await self.generator.process_book(book_id, raise_errors=True)
+            # Sections and summaries are final: refresh the packed bundle readers are served from
+            await self.exporter.export_book(book_id)
+        else:
+            raise ValueError(f"Unknown job type: {job['type']}")
+
+    async def heartbeat(self, job: Dict[str, Any], runner: asyncio.Task, lost: asyncio.Event):
+        """Keep a running job's lock fresh so no other worker takes it over.
+
+        If another worker has taken the job over anyway, the job's runner task is
+        cancelled so the two never write the same book's sections and summaries.
+        """
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                updated = await self.db.execute_raw(HEARTBEAT_SQL, job['id'], self.worker_id)
+                if not updated:
+                    logger.warning(f"Lost the lock on job {job['id']}; stopping it")
+                    lost.set()
+                    runner.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"Error refreshing lock on job {job['id']}: {str(e)}")
+
+    async def finish_job(self, job: Dict[str, Any], error: Optional[Exception] = None):
+        """Mark a job done, or schedule a retry with backoff.
+
+        Only a job this worker still holds is updated, never one another worker took over.
+        """
+        held = {"id": job['id'], "lockedBy": self.worker_id, "status": "running"}
+        if error is None:
+            updated = await self.db.job.update_many(where=held, data={"status": "done", "error": None})
+            if updated:
+                self.jobs_completed += 1
+            else:
+                logger.warning(f"Not finishing job {job['id']}: another worker holds it")
+            return
+
+        self.jobs_failed += 1
+        if job['attempts'] >= MAX_ATTEMPTS:
+            status = "failed"
+            run_after = datetime.now(timezone.utc)
+        else:
+            status = "pending"
+            run_after = datetime.now(timezone.utc) + timedelta(seconds=30 * 2 ** job['attempts'])
+        updated = await self.db.job.update_many(
+            where=held,
+            data={"status": status, "error": str(error), "runAfter": run_after, "lockedBy": None}
+        )
+        if not updated:
+            logger.warning(f"Not rescheduling job {job['id']}: another worker holds it")
+
+    async def poll(self):
+        """Run jobs until asked to stop"""
+        while not self.stopping.is_set():
+            self.last_poll = time.time()
+            try:
+                job = await self.claim_job()
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.current_job = job
+            logger.info(f"Running job {job['id']}: {job['type']} for book {job['bookId']}")
+            # The job runs in its own task so the heartbeat can stop it if the lock is lost
+            runner = asyncio.create_task(self.run_job(job))
+            lost = asyncio.Event()
+            heartbeat = asyncio.create_task(self.heartbeat(job, runner, lost))
+            try:
+                await runner
+                await self.finish_job(job)
+                logger.info(f"Completed job {job['id']}")
+            except asyncio.CancelledError:
+                if not lost.is_set():
+                    raise
+                logger.info(f"Abandoned job {job['id']} to the worker that took it over")
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {str(e)}")
+                await self.finish_job(job, e)
+            finally:
+                heartbeat.cancel()
+                self.current_job = None
+
+    async def health(self, request: web.Request) -> web.Response:
+        """Liveness and progress report for orchestrators"""
+        healthy = (
+            self.db.is_connected()
+            and self.last_poll is not None
+            # A long job blocks polling, so only idle staleness counts
+            and (self.current_job is not None or time.time() - self.last_poll < max(30, POLL_INTERVAL * 10))
+        )
+        body = {
+            "status": "ok" if healthy else "unhealthy",
+            "worker": self.worker_id,
+            "uptimeSeconds": int(time.time() - self.started_at),
+            "currentJob": self.current_job['id'] if self.current_job else None,
+            "jobsCompleted": self.jobs_completed,
+            "jobsFailed": self.jobs_failed,
+            "cachedBooks": len(self.generator.section_cache.entries)
+        }
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def serve(self):
+        """Run the health endpoint and the job loop until SIGTERM/SIGINT"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        app = web.Application()
+        app.router.add_get('/health', self.health)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '0.0.0.0', HEALTH_PORT)
+        await site.start()
+        logger.info(f"Worker {self.worker_id} listening for health checks on port {HEALTH_PORT}")
+
+        try:
+            await self.poll()
+        finally:
+            # The current job has finished by now; stop accepting health checks last
+            logger.info("Shutting down worker")
+            await runner.cleanup()
+
+async def main():
+    """Main function to run the worker daemon"""
+    worker = Worker()
+
+    try:
+        await worker.connect()
+        await worker.serve()
+    finally:
+        await worker.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())